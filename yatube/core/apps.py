@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.core.signals import request_finished
+        from django.db.backends.signals import connection_created
+
+        from . import slowlog
+        from .sqlite import configure
+        connection_created.connect(configure)
+        connection_created.connect(slowlog.install)
+        request_finished.connect(slowlog.request_finished)
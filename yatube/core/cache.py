@@ -0,0 +1,264 @@
+"""Кэш в файле SQLite, общий для всех процессов на одной машине.
+
+В отличие от LocMemCache запись, сделанная одним воркером, сразу видна
+остальным, а сброс поколений страниц доходит до всех процессов. Файл
+открывается в режиме WAL, поэтому чтения не ждут записи. Устаревшие
+записи удаляются по сроку жизни, а при переполнении — давно не
+читавшиеся (LRU).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .timing import timed
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL,'
+    ' expires REAL, accessed REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+# Время последнего чтения обновляется не чаще, чем раз в столько секунд
+TOUCH_RESOLUTION = 10
+# Проверка переполнения выполняется раз в столько записей
+CULL_EVERY = 100
+# Максимум параметров в одном запросе SQLite
+CHUNK = 500
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=30,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    @staticmethod
+    def _alive(expires, now):
+        return expires is None or expires > now
+
+    def _write(self, sql, params=()):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = db.execute(sql, params)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return cursor.rowcount
+
+    def _after_write(self, count=1):
+        self._writes += count
+        if self._writes >= CULL_EVERY:
+            self._writes = 0
+            self._cull()
+
+    def _cull(self):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+            total = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            if total > self._max_entries:
+                excess = total - self._max_entries
+                victims = max(excess, total // self._cull_frequency)
+                db.execute(
+                    'DELETE FROM cache WHERE key IN ('
+                    ' SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                    (victims,)
+                )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def _touch_stale(self, keys, now):
+        for start in range(0, len(keys), CHUNK):
+            chunk = keys[start:start + CHUNK]
+            marks = ','.join('?' * len(chunk))
+            self._write(
+                f'UPDATE cache SET accessed = ? WHERE key IN ({marks})',
+                [now, *chunk]
+            )
+
+    def _select(self, keys):
+        rows = {}
+        for start in range(0, len(keys), CHUNK):
+            chunk = keys[start:start + CHUNK]
+            marks = ','.join('?' * len(chunk))
+            rows.update(
+                (key, (value, expires, accessed))
+                for key, value, expires, accessed in self._db.execute(
+                    'SELECT key, value, expires, accessed FROM cache'
+                    f' WHERE key IN ({marks})', chunk
+                )
+            )
+        return rows
+
+    @timed('cache')
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        value = self._get_raw([key]).get(key)
+        return default if value is None else pickle.loads(value)
+
+    def _get_raw(self, keys):
+        now = time.time()
+        found = {}
+        stale = []
+        for key, (value, expires, accessed) in self._select(keys).items():
+            if not self._alive(expires, now):
+                continue
+            found[key] = value
+            if now - accessed > TOUCH_RESOLUTION:
+                stale.append(key)
+        if stale:
+            self._touch_stale(stale, now)
+        return found
+
+    @timed('cache')
+    def get_many(self, keys, version=None):
+        mapping = {self._key(key, version): key for key in keys}
+        found = self._get_raw(list(mapping))
+        return {
+            mapping[key]: pickle.loads(value) for key, value in found.items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    @timed('cache')
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        expires = self._expires(timeout)
+        rows = [
+            (self._key(key, version),
+             pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires, now)
+            for key, value in data.items()
+        ]
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed)'
+                ' VALUES (?, ?, ?, ?)', rows
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        self._after_write(len(rows))
+        return []
+
+    @timed('cache')
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now)
+            )
+            cursor = db.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires, accessed)'
+                ' VALUES (?, ?, ?, ?)',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                 self._expires(timeout), now)
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        added = cursor.rowcount > 0
+        if added:
+            self._after_write()
+        return added
+
+    @timed('cache')
+    def incr(self, key, delta=1, version=None):
+        """Атомарно для всех процессов: чтение и запись в одной транзакции."""
+        key = self._key(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or not self._alive(row[1], time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key)
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return value
+
+    @timed('cache')
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return bool(self._write(
+            'UPDATE cache SET expires = ? WHERE key = ?'
+            ' AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), key, time.time())
+        ))
+
+    @timed('cache')
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return key in self._get_raw([key])
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    @timed('cache')
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        for start in range(0, len(keys), CHUNK):
+            chunk = keys[start:start + CHUNK]
+            marks = ','.join('?' * len(chunk))
+            self._write(f'DELETE FROM cache WHERE key IN ({marks})', chunk)
+
+    @timed('cache')
+    def clear(self):
+        self._write('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение держим открытым между запросами: открытие файла
+        # дороже самих запросов к кэшу
+        pass
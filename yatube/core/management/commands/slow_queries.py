@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from core.slowlog import ORDERS, get_log
+
+
+class Command(BaseCommand):
+    help = ('Показывает формы SQL-запросов, на которые ушло больше всего '
+            'времени, по данным журнала запросов всех процессов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--order',
+            choices=sorted(ORDERS),
+            default='total',
+            help='Суммарное время, число выполнений, наибольшее или '
+                 'среднее время',
+        )
+        parser.add_argument('--view', help='Только запросы этого view')
+        parser.add_argument(
+            '--by-view',
+            action='store_true',
+            help='Отдельная строка для каждой пары форма и view',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Очистить журнал после вывода',
+        )
+
+    def handle(self, *args, **options):
+        log = get_log()
+        rows = log.top(options['limit'], options['order'], options['view'],
+                       options['by_view'])
+        for shape, views, count, total, longest in rows:
+            self.stdout.write(
+                f'{total * 1000:10.1f} мс всего  {count:8d} раз  '
+                f'{total / count * 1000:8.2f} мс в среднем  '
+                f'{longest * 1000:8.2f} мс max  [{views}]\n    {shape}'
+            )
+        if not rows:
+            self.stdout.write('Журнал запросов пуст')
+        if options['reset']:
+            log.reset()
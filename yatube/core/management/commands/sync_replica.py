@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replica import sync
+
+
+class Command(BaseCommand):
+    help = 'Обновляет реплики для чтения копией основной базы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Обновлять реплики, пока не прервут')
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Секунд между обновлениями с --loop '
+                 '(по умолчанию REPLICA_SYNC_INTERVAL)',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.REPLICA_DATABASES:
+            raise CommandError('Реплики не настроены: REPLICA_DATABASES '
+                               'пуст (YATUBE_REPLICA=1)')
+        interval = options['interval'] or settings.REPLICA_SYNC_INTERVAL
+        while True:
+            started = time.monotonic()
+            for alias in settings.REPLICA_DATABASES:
+                pages, elapsed = sync(alias)
+                self.stdout.write(f'{alias}: {pages} страниц за '
+                                  f'{elapsed:.2f} с')
+            if not options['loop']:
+                return
+            time.sleep(max(0, interval - (time.monotonic() - started)))
@@ -0,0 +1,93 @@
+"""Гистограммы длительности запросов в памяти процесса.
+
+Отдаются в текстовом формате Prometheus (exposition format 0.0.4).
+Каждый воркер копит свои значения; сборщик метрик опрашивает их по
+отдельности и суммирует сам.
+"""
+import threading
+from bisect import bisect_left
+
+
+def _labels(names, values):
+    pairs = ','.join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}' if pairs else ''
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [
+                    [0] * (len(self.buckets) + 1), 0.0
+                ]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                labels: (list(counts), total)
+                for labels, (counts, total) in self._series.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} histogram']
+        bounds = [_number(bound) for bound in self.buckets] + ['+Inf']
+        for labels, (counts, total) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                label = _labels(self.labels + ('le',), labels + (bound,))
+                lines.append(f'{self.name}_bucket{label} {cumulative}')
+            label = _labels(self.labels, labels)
+            lines.append(f'{self.name}_sum{label} {total!r}')
+            lines.append(f'{self.name}_count{label} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def histogram(self, name, documentation, labels, buckets):
+        if name not in self.metrics:
+            self.metrics[name] = Histogram(name, documentation, labels,
+                                           buckets)
+        return self.metrics[name]
+
+    def clear(self):
+        for metric in self.metrics.values():
+            metric.clear()
+
+    def exposition(self):
+        return ''.join(metric.exposition()
+                       for metric in self.metrics.values())
+
+
+registry = Registry()
@@ -0,0 +1,151 @@
+import logging
+import time
+
+from django.conf import settings
+
+from . import profiling, routers
+from .metrics import registry
+from .queries import record_queries
+from .timing import current, request_timer
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCountMiddleware:
+    """Считает SQL-запросы каждого запроса в режиме отладки и в тестах.
+
+    Число запросов уходит в заголовок ``X-Query-Count``, а сам учёт
+    прикрепляется к ответу как ``response.queries`` — по нему тесты
+    проверяют бюджет запросов view. Повторяющиеся формы запросов
+    пишутся в лог как вероятный N+1.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_INSTRUMENTATION:
+            return self.get_response(request)
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        response.queries = recorder
+        response['X-Query-Count'] = str(recorder.count)
+        repeated = recorder.repeated(settings.QUERY_REPEAT_THRESHOLD)
+        for shape, times in repeated.items():
+            logger.warning('%s: запрос выполнен %d раз: %s',
+                           request.path, times, shape)
+        return response
+
+
+class TimingMiddleware:
+    """Замеряет фазы каждого запроса и копит гистограммы по имени view.
+
+    Время SQL, кэша, шаблонов, миниатюр, самого view и ответа целиком
+    уходит в заголовок ``Server-Timing`` (миллисекунды) и в гистограммы,
+    которые отдаёт ``core:metrics``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        buckets = settings.REQUEST_TIMING_BUCKETS
+        self.duration = registry.histogram(
+            'yatube_request_duration_seconds',
+            'Полное время ответа по имени view.',
+            ('view',), buckets,
+        )
+        self.phases = registry.histogram(
+            'yatube_request_phase_seconds',
+            'Время фазы запроса (db, cache, template, thumbnail, view).',
+            ('view', 'phase'), buckets,
+        )
+
+    def __call__(self, request):
+        if not settings.REQUEST_TIMING:
+            return self.get_response(request)
+        with request_timer() as timer, record_queries() as queries:
+            response = self.get_response(request)
+        total = timer.total
+        if queries.count:
+            timer.add('db', queries.duration)
+        view_started = getattr(request, '_view_started', None)
+        if view_started is not None:
+            timer.add('view', time.perf_counter() - view_started)
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        self.duration.observe(total, view)
+        for name, elapsed in timer.phases.items():
+            self.phases.observe(elapsed, view, name)
+        metrics = [
+            f'{name};dur={elapsed * 1000:.1f}'
+            for name, elapsed in sorted(timer.phases.items())
+        ]
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_started = time.perf_counter()
+        timer = current()
+        if timer is not None:
+            # По имени view журнал запросов группирует их статистику
+            timer.view = request.resolver_match.view_name
+
+
+class ProfileMiddleware:
+    """По ``?__profile=1`` отдаёт персоналу профиль запроса вместо страницы.
+
+    Стоит после AuthenticationMiddleware; без флага в адресе только
+    проверяет строку запроса.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling.requested(request):
+            return self.get_response(request)
+        response, profiler, queries = profiling.profile(
+            request, self.get_response
+        )
+        return profiling.report(request, response, profiler, queries,
+                                settings.PROFILE_TOP)
+
+
+class ReplicaMiddleware:
+    """Отправляет чтения лент на реплики, см. ``core.routers``.
+
+    После запроса, который писал в базу, ставит cookie, и следующие
+    REPLICA_STICKY_SECONDS посетитель читает с основной базы.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+        with routers.tracking_writes() as writes:
+            try:
+                response = self.get_response(request)
+            finally:
+                routers.use_replica(None)
+        if writes.happened:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE,
+                str(int(time.time() + settings.REPLICA_STICKY_SECONDS)),
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (settings.REPLICA_DATABASES
+                and request.method in ('GET', 'HEAD')
+                and request.resolver_match.view_name in settings.REPLICA_VIEWS
+                and not self.sticky(request)):
+            routers.use_replica(routers.choose_replica())
+
+    @staticmethod
+    def sticky(request):
+        value = request.COOKIES.get(settings.REPLICA_STICKY_COOKIE, '')
+        return value.isdigit() and int(value) > time.time()
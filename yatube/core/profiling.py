@@ -0,0 +1,82 @@
+"""Профилирование одного запроса по флагу ``?__profile=1`` в адресе.
+
+Флаг действует только для персонала. Вместо страницы возвращается отчёт
+cProfile (самые долгие по суммарному времени функции, число вызовов и
+кто кого вызывает) и самые дорогие формы SQL-запросов. С
+``?__profile=prof`` отдаётся файл .prof для snakeviz или pstats;
+``__sort`` меняет порядок отчёта (cumulative, tottime, calls).
+
+Кэш страниц при профилировании не используется: иначе в отчёт попало бы
+чтение готовой копии, а не построение страницы.
+"""
+import cProfile
+import io
+import marshal
+import pstats
+from collections import defaultdict
+
+from django.http import HttpResponse
+
+from .queries import fingerprint, record_queries
+
+PARAM = '__profile'
+SORT_PARAM = '__sort'
+SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+
+def requested(request):
+    """Нужно ли профилировать запрос.
+
+    Строка запроса проверяется первой: без флага не разбираются ни GET,
+    ни сессия.
+    """
+    return (
+        PARAM in request.META.get('QUERY_STRING', '')
+        and bool(request.GET.get(PARAM))
+        and request.user.is_staff
+    )
+
+
+def profile(request, get_response):
+    request.profiling = True
+    profiler = cProfile.Profile()
+    with record_queries() as queries:
+        response = profiler.runcall(get_response, request)
+    return response, profiler, queries
+
+
+def top_queries(queries, limit):
+    """Формы запросов по суммарному времени: форма, число, секунды."""
+    shapes = defaultdict(lambda: [0, 0.0])
+    for sql, duration in queries.queries:
+        shape = shapes[fingerprint(sql)]
+        shape[0] += 1
+        shape[1] += duration
+    ranked = sorted(shapes.items(), key=lambda item: -item[1][1])
+    return [(sql, count, total) for sql, (count, total) in ranked[:limit]]
+
+
+def report(request, response, profiler, queries, limit):
+    if request.GET[PARAM] == 'prof':
+        profiler.create_stats()
+        download = HttpResponse(marshal.dumps(profiler.stats),
+                                content_type='application/octet-stream')
+        download['Content-Disposition'] = (
+            'attachment; filename="profile.prof"'
+        )
+        return download
+    sort = request.GET.get(SORT_PARAM)
+    if sort not in SORT_KEYS:
+        sort = SORT_KEYS[0]
+    out = io.StringIO()
+    out.write(f'{request.method} {request.path} -> {response.status_code}\n')
+    out.write(f'SQL: {queries.count} запросов, '
+              f'{queries.duration * 1000:.1f} мс\n\n')
+    for sql, count, total in top_queries(queries, limit):
+        out.write(f'{total * 1000:9.2f} мс {count:5d} × {sql}\n')
+    out.write('\n')
+    stats = pstats.Stats(profiler, stream=out).sort_stats(sort)
+    stats.print_stats(limit)
+    stats.print_callees(limit // 2)
+    return HttpResponse(out.getvalue(),
+                        content_type='text/plain; charset=utf-8')
@@ -0,0 +1,65 @@
+"""Учёт SQL-запросов запроса: число, время и повторяющиеся формы.
+
+Форма (fingerprint) — текст запроса без значений параметров. Одна и та
+же форма, выполненная много раз за запрос, почти всегда означает
+N+1: связанные объекты догружаются по одному в цикле шаблона.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Нормализует SQL: значения заменяются на ?, списки IN сворачиваются."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """Обёртка execute, запоминающая SQL и время каждого запроса."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated(self, threshold):
+        """Формы запросов, выполненные не менее ``threshold`` раз."""
+        shapes = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return {
+            shape: times for shape, times in shapes.items()
+            if times >= threshold
+        }
+
+
+@contextmanager
+def record_queries(recorder=None):
+    """Записывает запросы ко всем базам внутри блока."""
+    recorder = recorder or QueryRecorder()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
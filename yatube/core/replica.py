@@ -0,0 +1,40 @@
+"""Реплика для чтения — копия основной базы SQLite.
+
+Копия снимается онлайн-бэкапом SQLite (sqlite3.Connection.backup): это
+согласованный снимок, а в режиме WAL он не останавливает запись в
+основную базу. Команда sync_replica повторяет копирование раз в
+REPLICA_SYNC_INTERVAL секунд, так что реплика отстаёт не больше чем на
+этот интервал и время самого копирования.
+"""
+import sqlite3
+import time
+
+from django.db import connections
+from django.dispatch import Signal
+
+# Отправляется после обновления реплики, аргумент alias
+replica_synced = Signal(providing_args=['alias'])
+
+
+def copy(source, target):
+    """Онлайн-бэкап файла базы ``source`` в ``target``; число страниц."""
+    src = sqlite3.connect(source, timeout=30)
+    dst = sqlite3.connect(target, timeout=30)
+    try:
+        src.backup(dst)
+        return dst.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        src.close()
+        dst.close()
+
+
+def sync(alias, source='default'):
+    """Переписывает реплику ``alias`` копией базы ``source``.
+
+    Возвращает число страниц базы и секунды копирования.
+    """
+    started = time.monotonic()
+    pages = copy(connections[source].settings_dict['NAME'],
+                 connections[alias].settings_dict['NAME'])
+    replica_synced.send(sender=sync, alias=alias)
+    return pages, time.monotonic() - started
@@ -0,0 +1,86 @@
+"""Чтение страниц-лент с реплик, запись и всё остальное — с основной базы.
+
+ReplicaMiddleware включает реплики на время GET-запроса к одному из view
+REPLICA_VIEWS. Тогда чтения моделей приложений REPLICA_APPS уходят на
+одну из баз REPLICA_DATABASES, выбранную на весь запрос; сессии,
+пользователи и всё прочее читаются с основной базы.
+
+Реплика отстаёт от основной базы, поэтому посетитель, который только что
+писал, ещё REPLICA_STICKY_SECONDS читает с основной: иначе он не увидел
+бы собственный комментарий или пост.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+
+_state = threading.local()
+
+
+def replica():
+    """База-реплика текущего запроса или None."""
+    return getattr(_state, 'replica', None)
+
+
+def use_replica(alias):
+    """Направляет чтения потока на реплику ``alias`` (None — на основную)."""
+    _state.replica = alias
+
+
+def choose_replica():
+    """Случайная реплика или None, если все они — сама основная база.
+
+    Так бывает в тестах, где реплика — зеркало (TEST MIRROR) основной
+    базы: отдельное соединение не увидело бы данных в транзакции теста.
+    """
+    primary = connections[PRIMARY].settings_dict['NAME']
+    aliases = [
+        alias for alias in settings.REPLICA_DATABASES
+        if connections[alias].settings_dict['NAME'] != primary
+    ]
+    return random.choice(aliases) if aliases else None
+
+
+@contextmanager
+def tracking_writes():
+    """Отмечает в ``writes.happened``, писал ли код внутри блока в базу."""
+    previous = getattr(_state, 'writes', None)
+    _state.writes = writes = Writes()
+    try:
+        yield writes
+    finally:
+        _state.writes = previous
+
+
+class Writes:
+    happened = False
+
+
+def note_write():
+    writes = getattr(_state, 'writes', None)
+    if writes is not None:
+        writes.happened = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = replica()
+        if alias and model._meta.app_label in settings.REPLICA_APPS:
+            return alias
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        note_write()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и на основной базе
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему реплика получает вместе с копией основной базы
+        return db not in settings.REPLICA_DATABASES
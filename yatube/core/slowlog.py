@@ -0,0 +1,188 @@
+"""Журнал SQL-запросов: статистика по формам запросов и медленные запросы.
+
+Обёртка execute ставится на каждое соединение с базой при его открытии.
+Для каждой пары (форма запроса, view) копятся число выполнений,
+суммарное и наибольшее время. По окончании запроса, но не чаще раза в
+SLOW_QUERY_FLUSH_INTERVAL секунд, процесс добавляет накопленное в общий
+файл SQLite, из которого команда slow_queries показывает худшие формы по
+всем процессам сразу. Сам запрос к базе файла не касается; команды и
+фоновые потоки сбрасывают статистику при выходе из процесса.
+
+Запросы дольше SLOW_QUERY_THRESHOLD пишутся в лог вместе с местом в коде
+проекта, откуда они выполнены.
+"""
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from functools import lru_cache
+
+from django.conf import settings
+
+from . import timing
+from .queries import fingerprint
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS queries ('
+    ' fingerprint TEXT NOT NULL, view TEXT NOT NULL,'
+    ' count INTEGER NOT NULL, total REAL NOT NULL, max REAL NOT NULL,'
+    ' PRIMARY KEY (fingerprint, view))'
+)
+# Запросы вне view: команды, фоновые потоки
+NO_VIEW = '-'
+ORDERS = {
+    'total': 'SUM(total)',
+    'count': 'SUM(count)',
+    'max': 'MAX(max)',
+    'mean': 'SUM(total) / SUM(count)',
+}
+
+_shape = lru_cache(maxsize=2048)(fingerprint)
+
+
+def _connect(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(SCHEMA)
+    return conn
+
+
+def origin():
+    """Последний кадр стека в коде проекта, не считая этого модуля."""
+    root = settings.BASE_DIR
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        path = frame.filename
+        if (path.startswith(root) and path != __file__
+                and 'site-packages' not in path):
+            path = os.path.relpath(path, root)
+            return f'{path}:{frame.lineno} in {frame.name}'
+    return 'неизвестно'
+
+
+class QueryLog:
+    def __init__(self, path, threshold, flush_interval):
+        self.path = path
+        self.threshold = threshold
+        self.flush_interval = flush_interval
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._flushed = time.monotonic()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, time.perf_counter() - started)
+
+    def record(self, sql, duration):
+        timer = timing.current()
+        view = getattr(timer, 'view', None) or NO_VIEW
+        key = (_shape(sql), view)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                self._stats[key] = [1, duration, duration]
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = max(stats[2], duration)
+        if duration >= self.threshold:
+            logger.warning('Медленный запрос %.1f мс (%s, %s): %s',
+                           duration * 1000, view, origin(), sql[:1000])
+
+    def flush_due(self):
+        """Сбрасывает статистику, если с прошлого раза прошёл интервал."""
+        if time.monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Добавляет накопленное в общий файл и начинает счёт заново."""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            self._flushed = time.monotonic()
+        if not stats:
+            return
+        rows = [(shape, view, count, total, longest)
+                for (shape, view), (count, total, longest) in stats.items()]
+        conn = _connect(self.path)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'INSERT INTO queries (fingerprint, view, count, total, max)'
+                ' VALUES (?, ?, ?, ?, ?)'
+                ' ON CONFLICT (fingerprint, view) DO UPDATE SET'
+                ' count = count + excluded.count,'
+                ' total = total + excluded.total,'
+                ' max = MAX(max, excluded.max)', rows
+            )
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            logger.exception('Не удалось сохранить статистику запросов')
+        finally:
+            conn.close()
+
+    def top(self, limit=20, order='total', view=None, by_view=False):
+        """Худшие формы запросов: форма, view, число, сумма, максимум."""
+        self.flush()
+        group = 'fingerprint, view' if by_view else 'fingerprint'
+        where, params = '', []
+        if view:
+            where, params = 'WHERE view = ?', [view]
+        views = 'view' if by_view else 'GROUP_CONCAT(DISTINCT view)'
+        conn = _connect(self.path)
+        try:
+            return conn.execute(
+                f'SELECT fingerprint, {views}, SUM(count), SUM(total),'
+                f' MAX(max) FROM queries {where} GROUP BY {group}'
+                f' ORDER BY {ORDERS[order]} DESC LIMIT ?',
+                params + [limit]
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+        conn = _connect(self.path)
+        try:
+            conn.execute('DELETE FROM queries')
+        finally:
+            conn.close()
+
+
+_log = None
+
+
+def get_log():
+    global _log
+    if _log is None:
+        _log = QueryLog(settings.SLOW_QUERY_LOG_PATH,
+                        settings.SLOW_QUERY_THRESHOLD,
+                        settings.SLOW_QUERY_FLUSH_INTERVAL)
+        atexit.register(_log.flush)
+    return _log
+
+
+def install(sender, connection, **kwargs):
+    """Приёмник connection_created: ставит журнал на новое соединение."""
+    if not settings.SLOW_QUERY_LOG:
+        return
+    log = get_log()
+    if log not in connection.execute_wrappers:
+        connection.execute_wrappers.append(log)
+
+
+def request_finished(sender, **kwargs):
+    """Приёмник request_finished: сброс статистики вне пути запроса к базе."""
+    if _log is not None:
+        _log.flush_due()
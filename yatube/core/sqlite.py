@@ -0,0 +1,50 @@
+"""Боевой профиль SQLite: WAL, mmap, busy_timeout, постоянные соединения.
+
+По умолчанию SQLite пишет журнал отката: пока идёт запись, читатели
+ждут, а конкурирующий писатель сразу получает «database is locked». В
+режиме WAL читатели не мешают писателю, busy_timeout заставляет
+писателей ждать друг друга, а не падать, synchronous=NORMAL убирает
+fsync на каждом коммите (в WAL это безопасно для целостности), mmap
+отдаёт чтение страниц ядру.
+
+Профиль включается переменной окружения YATUBE_SQLITE_PRODUCTION=1:
+тогда settings берут DATABASES из ``database()`` с CONN_MAX_AGE, и
+прагмы выставляются один раз на каждое новое соединение.
+"""
+from django.conf import settings
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # Миллисекунды ожидания чужой записи вместо ошибки
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Размер кэша страниц в КиБ (отрицательное значение)
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+
+
+def database(name, conn_max_age=600):
+    """Настройки базы для DATABASES в боевом профиле."""
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': conn_max_age,
+        'OPTIONS': {
+            # Таймаут блокировки в sqlite3.connect, секунды
+            'timeout': PRAGMAS['busy_timeout'] / 1000,
+        },
+    }
+
+
+def apply_pragmas(connection, pragmas=None):
+    with connection.cursor() as cursor:
+        for name, value in (pragmas or PRAGMAS).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure(sender, connection, **kwargs):
+    """Приёмник connection_created: прагмы профиля на новое соединение."""
+    if settings.SQLITE_PRODUCTION and connection.vendor == 'sqlite':
+        apply_pragmas(connection, settings.SQLITE_PRAGMAS)
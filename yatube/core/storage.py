@@ -0,0 +1,88 @@
+"""Хранилище файлов с адресацией по содержимому.
+
+Имя файла — SHA-256 его содержимого, поэтому одинаковые загрузки
+хранятся одной копией, а миниатюры sorl (их ключ строится от имени
+исходника) у дубликатов тоже общие. Файлы не удаляются при удалении
+записей: на один файл может ссылаться несколько постов. Сиротами
+занимается команда ``gc_media``.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Файлы, которые пишутся прямо сейчас; сборщик мусора их не трогает
+PARTIAL_SUFFIX = '.part'
+
+
+def _umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# mkstemp создаёт файл с правами 0600; без FILE_UPLOAD_PERMISSIONS файл
+# должен получить те же права, что и обычный open() при текущем umask
+DEFAULT_FILE_MODE = 0o666 & ~_umask()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Окончательное имя выбирает _save по содержимому файла
+        return name
+
+    def digest_name(self, directory, digest, extension):
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        """Пишет файл во временный, одновременно считая хэш.
+
+        Если файл с таким содержимым уже есть, временный просто
+        удаляется и возвращается имя существующего. Время изменения
+        существующего обновляется: для ``gc_media --grace`` он снова
+        свежий, пока новый пост со ссылкой на него не сохранён.
+        """
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(
+            dir=self.path(directory), suffix=PARTIAL_SUFFIX
+        )
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            name = self.digest_name(directory, digest.hexdigest(), extension)
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                mode = self.file_permissions_mode
+                os.chmod(temp_path,
+                         DEFAULT_FILE_MODE if mode is None else mode)
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name.replace('\\', '/')
+
+    def walk(self, directory):
+        """Имена всех сохранённых файлов каталога, кроме недописанных."""
+        root = self.path(directory)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(PARTIAL_SUFFIX):
+                    continue
+                path = os.path.join(dirpath, filename)
+                yield os.path.relpath(path, self.location).replace('\\', '/')
+
+
+content_storage = ContentAddressedStorage()
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.test import override_settings
+
+
+class QueryBudgetMixin:
+    """Проверки бюджета SQL-запросов для тестов view.
+
+    Включает учёт запросов: ответы тестового клиента несут его из
+    QueryCountMiddleware.
+    """
+
+    def setUp(self):
+        super().setUp()
+        instrumentation = override_settings(QUERY_INSTRUMENTATION=True)
+        instrumentation.enable()
+        self.addCleanup(instrumentation.disable)
+
+    def assertQueryBudget(self, response, budget):
+        recorder = response.queries
+        self.assertLessEqual(
+            recorder.count, budget,
+            f'{response.wsgi_request.path}: {recorder.count} запросов '
+            f'при бюджете {budget}'
+        )
+        repeated = recorder.repeated(settings.QUERY_REPEAT_THRESHOLD)
+        self.assertFalse(
+            repeated,
+            f'{response.wsgi_request.path}: повторяющиеся запросы (N+1)'
+        )
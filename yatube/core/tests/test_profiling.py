@@ -0,0 +1,38 @@
+import marshal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+User = get_user_model()
+
+
+class ProfileMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='admin', is_staff=True)
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_staff_gets_report(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('posts:index'),
+                                   {'__profile': '1'})
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; charset=utf-8')
+        report = response.content.decode()
+        self.assertIn('GET / -> 200', report)
+        self.assertIn('SQL:', report)
+        self.assertIn('Ordered by: cumulative time', report)
+
+    def test_prof_download(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('posts:index'),
+                                   {'__profile': 'prof'})
+        self.assertIn('profile.prof', response['Content-Disposition'])
+        self.assertTrue(marshal.loads(response.content))
+
+    def test_ignored_for_others(self):
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('posts:index'),
+                                   {'__profile': '1'})
+        self.assertTemplateUsed(response, 'posts/index.html')
@@ -0,0 +1,104 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve, reverse
+
+from core import routers
+from core.middleware import ReplicaMiddleware
+from core.replica import copy
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+@mock.patch('core.routers.choose_replica', return_value='replica')
+class ReplicaRoutingTest(SimpleTestCase):
+    def request(self, path, method='get', **cookies):
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies)
+        request.resolver_match = resolve(path)
+        return request
+
+    def run_middleware(self, request, write=False):
+        """Прогоняет запрос через middleware; база чтения Post и ответ."""
+        seen = {}
+
+        def view(request):
+            seen['read'] = routers.ReplicaRouter().db_for_read(Post)
+            seen['user'] = routers.ReplicaRouter().db_for_read(User)
+            if write:
+                routers.ReplicaRouter().db_for_write(Post)
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(view)
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware.get_response = get_response
+        response = middleware(request)
+        self.assertIsNone(routers.replica())
+        return seen, response
+
+    def test_feed_reads_from_replica(self, choose_replica):
+        seen, response = self.run_middleware(
+            self.request(reverse('posts:index')))
+        self.assertEqual(seen, {'read': 'replica', 'user': 'default'})
+        self.assertNotIn('primary_until', response.cookies)
+
+    def test_other_views_use_primary(self, choose_replica):
+        seen, _ = self.run_middleware(self.request(reverse('posts:search')))
+        self.assertEqual(seen['read'], 'default')
+
+    def test_write_makes_session_sticky(self, choose_replica):
+        path = reverse('posts:add_comment', args=(1,))
+        _, response = self.run_middleware(self.request(path, 'post'),
+                                          write=True)
+        until = response.cookies['primary_until'].value
+        seen, _ = self.run_middleware(
+            self.request(reverse('posts:index'), primary_until=until))
+        self.assertEqual(seen['read'], 'default')
+        expired = str(int(time.time()) - 1)
+        seen, _ = self.run_middleware(
+            self.request(reverse('posts:index'), primary_until=expired))
+        self.assertEqual(seen['read'], 'replica')
+
+
+@override_settings(REPLICA_DATABASES=['default'])
+class MirrorReplicaTest(SimpleTestCase):
+    def test_mirror_of_primary_is_not_used(self):
+        self.assertIsNone(routers.choose_replica())
+
+
+class ReplicaCopyTest(SimpleTestCase):
+    def test_copy_is_consistent_snapshot(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        source = os.path.join(directory, 'primary.sqlite3')
+        target = os.path.join(directory, 'replica.sqlite3')
+        conn = sqlite3.connect(source)
+        conn.execute('CREATE TABLE post (text TEXT)')
+        conn.execute("INSERT INTO post VALUES ('первый')")
+        conn.commit()
+        copy(source, target)
+        conn.execute("INSERT INTO post VALUES ('второй')")
+        conn.commit()
+        conn.close()
+        replica = sqlite3.connect(target)
+        self.assertEqual(replica.execute('SELECT COUNT(*) FROM post')
+                         .fetchone()[0], 1)
+        replica.close()
+        copy(source, target)
+        replica = sqlite3.connect(target)
+        self.assertEqual(replica.execute('SELECT COUNT(*) FROM post')
+                         .fetchone()[0], 2)
+        replica.close()
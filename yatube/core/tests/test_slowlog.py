@@ -0,0 +1,59 @@
+import shutil
+import tempfile
+
+from django.db import connection
+from django.test import TestCase
+
+from core import timing
+from core.slowlog import QueryLog
+
+
+class QueryLogTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.log = QueryLog(f'{self.directory}/queries.sqlite3',
+                            threshold=10, flush_interval=60)
+
+    def run_queries(self, *values):
+        with connection.execute_wrapper(self.log), \
+                connection.cursor() as cursor:
+            for value in values:
+                cursor.execute('SELECT %s', [value])
+
+    def test_aggregates_by_fingerprint_and_view(self):
+        self.run_queries(1, 2)
+        with timing.request_timer() as timer:
+            timer.view = 'posts:index'
+            self.run_queries(3)
+        rows = self.log.top(by_view=True)
+        self.assertEqual(
+            sorted((shape, view, count) for shape, view, count, _, _ in rows),
+            [('SELECT %s', '-', 2), ('SELECT %s', 'posts:index', 1)]
+        )
+        shape, views, count, total, longest = self.log.top()[0]
+        self.assertEqual(count, 3)
+        self.assertLessEqual(longest, total)
+
+    def test_flush_accumulates(self):
+        self.run_queries(1)
+        self.log.flush()
+        self.run_queries(2)
+        self.assertEqual(self.log.top()[0][2], 2)
+        self.log.reset()
+        self.assertEqual(self.log.top(), [])
+
+    def test_slow_query_logged_with_origin(self):
+        self.log.threshold = 0
+        with self.assertLogs('core.slowlog', 'WARNING') as logs:
+            self.run_queries(1)
+        self.assertIn('core/tests/test_slowlog.py', logs.output[0])
+        self.assertIn('in run_queries', logs.output[0])
+
+    def test_flush_waits_for_request_end(self):
+        """Запрос к базе не пишет в файл: сброс идёт по окончании запроса."""
+        self.log.flush_interval = 0
+        self.run_queries(1)
+        self.assertEqual(len(self.log._stats), 1)
+        self.log.flush_due()
+        self.assertEqual(self.log._stats, {})
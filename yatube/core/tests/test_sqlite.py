@@ -0,0 +1,34 @@
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+
+from core.sqlite import PRAGMAS, apply_pragmas, configure, database
+
+
+class SQLiteProfileTest(SimpleTestCase):
+    databases = {'default'}
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_database_settings(self):
+        config = database('/tmp/db.sqlite3')
+        self.assertEqual(config['CONN_MAX_AGE'], 600)
+        self.assertEqual(config['OPTIONS']['timeout'],
+                         PRAGMAS['busy_timeout'] / 1000)
+
+    def test_pragmas_only_when_enabled(self):
+        pragmas = {'busy_timeout': 1234, 'cache_size': -3000}
+        self.addCleanup(apply_pragmas, connection, {
+            name: self.pragma(name) for name in pragmas
+        })
+        with override_settings(SQLITE_PRODUCTION=False,
+                               SQLITE_PRAGMAS=pragmas):
+            configure(None, connection)
+        self.assertNotEqual(self.pragma('busy_timeout'), 1234)
+        with override_settings(SQLITE_PRODUCTION=True,
+                               SQLITE_PRAGMAS=pragmas):
+            configure(None, connection)
+        self.assertEqual(self.pragma('busy_timeout'), 1234)
+        self.assertEqual(self.pragma('cache_size'), -3000)
@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core.metrics import Histogram, registry
+
+User = get_user_model()
+
+
+class TimingMiddlewareTest(TestCase):
+    def setUp(self):
+        registry.clear()
+        cache.clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('posts:index'))
+        phases = dict(
+            item.split(';dur=')
+            for item in response['Server-Timing'].split(', ')
+        )
+        self.assertIn('total', phases)
+        self.assertIn('view', phases)
+        self.assertIn('template', phases)
+        self.assertLessEqual(float(phases['view']), float(phases['total']))
+
+    def test_metrics_staff_only(self):
+        self.client.get(reverse('posts:index'))
+        url = reverse('core:metrics')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(
+            User.objects.create_user(username='reader'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(
+            User.objects.create_user(username='admin', is_staff=True))
+        content = self.client.get(url).content.decode()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      content)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 1',
+            content
+        )
+
+
+class HistogramTest(TestCase):
+    def test_cumulative_buckets(self):
+        histogram = Histogram('latency', 'Задержка.', ('view',), (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, 'a"b')
+        lines = histogram.exposition().splitlines()
+        self.assertEqual(lines[2:], [
+            'latency_bucket{view="a\\"b",le="0.1"} 2',
+            'latency_bucket{view="a\\"b",le="1"} 3',
+            'latency_bucket{view="a\\"b",le="+Inf"} 4',
+            'latency_sum{view="a\\"b"} 3.65',
+            'latency_count{view="a\\"b"} 4',
+        ])
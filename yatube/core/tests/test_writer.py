@@ -0,0 +1,75 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from core.writer import Writer, write
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(WRITE_QUEUE=True)
+class WriterTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer')
+        self.post = Post.objects.create(author=self.user, text='Пост')
+
+    def test_batch_isolates_failures(self):
+        writer = Writer(batch=10, window=0.2)
+        futures = [
+            writer.submit(Comment.objects.create, post=self.post,
+                          author=self.user, text='Первый'),
+            writer.submit(User.objects.create, username='writer'),
+            writer.submit(Comment.objects.create, post=self.post,
+                          author=self.user, text='Второй'),
+        ]
+        self.assertEqual(futures[0].result(5).text, 'Первый')
+        with self.assertRaises(IntegrityError):
+            futures[1].result(5)
+        self.assertEqual(futures[2].result(5).text, 'Второй')
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_result_before_commit_hooks(self):
+        """Ответ отдаётся сразу после коммита, до обработчиков on_commit."""
+        writer = Writer(batch=10, window=0)
+        release = threading.Event()
+
+        def create():
+            transaction.on_commit(lambda: release.wait(5))
+            return Comment.objects.create(post=self.post, author=self.user,
+                                          text='Сразу')
+
+        future = writer.submit(create)
+        try:
+            self.assertEqual(future.result(2).text, 'Сразу')
+        finally:
+            release.set()
+
+    def test_failed_batch_keeps_thread(self):
+        """Сбой всей пачки отдаётся каждому ожидающему, поток не падает."""
+        writer = Writer(batch=10, window=0)
+        with mock.patch('core.writer.close_old_connections',
+                        side_effect=RuntimeError('нет базы')), \
+                self.assertLogs('core.writer', 'ERROR'):
+            future = writer.submit(Comment.objects.count)
+            with self.assertRaises(RuntimeError):
+                future.result(5)
+        self.assertEqual(writer.submit(Comment.objects.count).result(5), 0)
+
+    def test_view_writes_through_queue(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('posts:add_comment', args=(self.post.pk,)),
+                         {'text': 'Из очереди'})
+        self.assertTrue(Comment.objects.filter(text='Из очереди').exists())
+
+    def test_direct_inside_transaction(self):
+        def thread_name():
+            return threading.current_thread().name
+
+        self.assertEqual(write(thread_name), 'db-writer')
+        with transaction.atomic():
+            self.assertNotEqual(write(thread_name), 'db-writer')
@@ -0,0 +1,80 @@
+"""Замер фаз обработки запроса: SQL, кэш, шаблоны, миниатюры, view.
+
+Таймер текущего запроса хранится в потоке. Код фаз оборачивается в
+``phase(name)`` или декоратор ``timed(name)``; вне запроса, например в
+командах, замер ничего не стоит. Вложенные вызовы одной фазы (шаблон,
+отрисованный внутри шаблона) считаются один раз.
+
+Фазы пересекаются: SQL и кэш выполняются внутри view и шаблонов, поэтому
+их сумма не равна полному времени ответа.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+_local = threading.local()
+
+
+class RequestTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.phases = {}
+        self._depth = {}
+
+    def enter(self, name):
+        depth = self._depth.get(name, 0)
+        self._depth[name] = depth + 1
+        return depth == 0
+
+    def leave(self, name, elapsed):
+        self._depth[name] -= 1
+        if elapsed is not None:
+            self.add(name, elapsed)
+
+    def add(self, name, elapsed):
+        self.phases[name] = self.phases.get(name, 0) + elapsed
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started
+
+
+def current():
+    return getattr(_local, 'timer', None)
+
+
+@contextmanager
+def request_timer():
+    """Включает замер фаз для кода внутри блока (одного запроса)."""
+    previous = current()
+    _local.timer = timer = RequestTimer()
+    try:
+        yield timer
+    finally:
+        _local.timer = previous
+
+
+@contextmanager
+def phase(name):
+    timer = current()
+    if timer is None:
+        yield
+        return
+    outermost = timer.enter(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.leave(name, time.perf_counter() - started if outermost else None)
+
+
+def timed(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,51 @@
+"""Ограничение размера загружаемых файлов прямо при разборе запроса."""
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+
+def rejected(request):
+    """Отброшен ли файл запроса из-за MAX_UPLOAD_SIZE."""
+    return getattr(request, 'upload_rejected', False)
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """Перестаёт читать запрос, как только файл превысил MAX_UPLOAD_SIZE.
+
+    Стоит первым в FILE_UPLOAD_HANDLERS. Если уже CONTENT_LENGTH больше
+    лимита файла и допустимого объёма остальных полей, тело не читается
+    вовсе. Иначе куски уходят следующим обработчикам, пока файл в
+    пределах лимита, а на первом лишнем байте разбор прекращается. Остаток
+    тела не дочитывается, а у запроса ставится ``upload_rejected`` — форма
+    покажет понятную ошибку.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        limit = settings.MAX_UPLOAD_SIZE + (
+            settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 0
+        )
+        if content_length > limit:
+            # StopUpload отсюда разбор не ловит: отдаём пустые данные
+            self.reject()
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.MAX_UPLOAD_SIZE:
+            self.reject()
+            raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def reject(self):
+        if self.request is not None:
+            self.request.upload_rejected = True
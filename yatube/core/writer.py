@@ -0,0 +1,123 @@
+"""Единственный писатель в базу на процесс.
+
+SQLite пропускает одну запись за раз: параллельные транзакции запросов
+ждут блокировку и повторяют попытки. Если WRITE_QUEUE включён, пишущие
+операции view передаются одному потоку-писателю, а поток запроса ждёт
+их Future. Писатель берёт из очереди всё накопившееся (до
+WRITE_QUEUE_BATCH операций, подождав новых не дольше WRITE_QUEUE_WINDOW
+секунд) и выполняет одной транзакцией: один коммит и одна синхронизация
+журнала на пачку. Каждая операция идёт в своей точке сохранения, так что
+ошибка одной не откатывает остальные. Ответы вызывающим отдаются сразу
+после коммита, раньше прочих обработчиков on_commit.
+
+Чтение идёт как прежде, в потоке запроса. Без WRITE_QUEUE, внутри чужой
+транзакции и в самом писателе операция выполняется сразу в своей
+транзакции.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from . import routers
+
+logger = logging.getLogger(__name__)
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+class Writer:
+    def __init__(self, batch, window):
+        self.batch = batch
+        self.window = window
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.loop, name='db-writer',
+                                       daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self.queue.put((future, func, args, kwargs))
+        return future
+
+    def take(self):
+        """Первая операция и всё, что успело прийти за окно ожидания."""
+        items = [self.queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(items) < self.batch:
+            timeout = deadline - time.monotonic()
+            try:
+                items.append(self.queue.get(timeout=max(timeout, 0)))
+            except queue.Empty:
+                break
+        return items
+
+    def loop(self):
+        while True:
+            items = self.take()
+            try:
+                close_old_connections()
+                self.execute(items)
+            except Exception as error:
+                # Не записана ни одна операция пачки, но поток живёт дальше
+                logger.exception('Пачка записей не выполнена')
+                for future, _, _, _ in items:
+                    if not future.done():
+                        future.set_exception(error)
+
+    def execute(self, items):
+        results = []
+
+        def resolve():
+            for future, result, error in results:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+        with transaction.atomic():
+            # Первый в очереди on_commit: вызывающие не ждут миниатюр и
+            # прочих обработчиков, поставленных операциями пачки
+            transaction.on_commit(resolve)
+            for future, func, args, kwargs in items:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with transaction.atomic():
+                        results.append((future, func(*args, **kwargs), None))
+                except Exception as error:
+                    results.append((future, None, error))
+
+
+def writer():
+    """Писатель текущего процесса; после fork создаётся заново."""
+    global _writer, _writer_pid
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            _writer = Writer(settings.WRITE_QUEUE_BATCH,
+                             settings.WRITE_QUEUE_WINDOW)
+            _writer_pid = os.getpid()
+        return _writer
+
+
+def write(func, *args, **kwargs):
+    """Выполняет пишущую операцию и возвращает её результат."""
+    direct = (
+        not settings.WRITE_QUEUE
+        or connection.in_atomic_block
+        or threading.current_thread().name == 'db-writer'
+    )
+    if direct:
+        with transaction.atomic():
+            return func(*args, **kwargs)
+    # Роутер в потоке писателя не видит запрос: отмечаем запись здесь
+    routers.note_write()
+    future = writer().submit(func, *args, **kwargs)
+    return future.result(settings.WRITE_QUEUE_TIMEOUT)
@@ -0,0 +1,184 @@
+"""Кэш страниц с ключами по поколениям.
+
+У каждой области (лента, группа, профиль, пост) есть номер поколения.
+Ключ страницы включает поколения всех областей, от которых она зависит,
+поэтому после записи достаточно увеличить номер — старые копии больше
+не найдутся и просто истекут. Сами страницы живут долго.
+
+Пересчёт страницы защищён от лавины промахов: его выполняет один
+процесс, остальные отдают прежнюю копию или ждут результата. После смены
+поколения прежней копии под новым ключом нет, поэтому последняя
+построенная версия страницы хранится ещё и под ключом без поколений.
+"""
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.routers import replica
+
+from .models import Group
+
+VERSION_PREFIX = 'posts:version:'
+PAGE_PREFIX = 'posts:page:'
+LOCK_PREFIX = 'posts:lock:'
+LAST_PREFIX = 'posts:last:'
+# Шаг ожидания, пока страницу пересчитывает другой процесс
+WAIT_STEP = 0.05
+
+
+def _initial_version():
+    # Если номер вытеснен из кэша, начинаем с заведомо большего значения,
+    # чтобы не совпасть со старыми ключами страниц
+    return int(time.time() * 1000)
+
+
+def version_map(scopes):
+    """Номера поколений областей одним get_many: {область: номер}."""
+    keys = [VERSION_PREFIX + scope for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial_version(), None)
+            found[key] = cache.get(key)
+    return {scope: found[VERSION_PREFIX + scope] for scope in scopes}
+
+
+def versions(scopes):
+    found = version_map(scopes)
+    return '.'.join(str(found[scope]) for scope in scopes)
+
+
+def bump(*scopes):
+    """Делает недействительными все страницы, зависящие от областей."""
+    for scope in set(scopes):
+        key = VERSION_PREFIX + scope
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), None)
+
+
+def bump_post(post, *group_ids):
+    """Сбрасывает все страницы, где виден пост: ленты, профиль, группы."""
+    slugs = Group.objects.filter(
+        pk__in=[pk for pk in group_ids if pk is not None]
+    ).values_list('slug', flat=True)
+    bump('index', f'post:{post.pk}', f'profile:{post.author.username}',
+         *[f'group:{slug}' for slug in slugs])
+
+
+def _variant(request):
+    """Часть ключа, зависящая от посетителя.
+
+    Анонимам отдаётся общая копия, авторизованным — своя: в странице есть
+    имя пользователя и CSRF-токен формы комментария.
+    """
+    if not request.user.is_authenticated:
+        return 'anon'
+    token = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return f'{request.user.pk}:{token}'
+
+
+def page_key(request, scopes):
+    if replica():
+        # Страница с реплики может отставать от поколений основной базы:
+        # такие копии живут до следующего обновления реплики
+        scopes = [*scopes, 'replica']
+    raw = ':'.join((versions(scopes), _variant(request),
+                    request.get_full_path()))
+    return PAGE_PREFIX + hashlib.md5(raw.encode()).hexdigest()
+
+
+def last_key(request):
+    """Ключ последней построенной версии страницы, без поколений."""
+    raw = ':'.join((_variant(request), request.get_full_path()))
+    return LAST_PREFIX + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _should_refresh(fresh_until, compute_time, beta=1.0):
+    """Вероятностный досрочный пересчёт (XFetch).
+
+    Чем ближе конец свежести и чем дольше страница строится, тем выше
+    шанс, что один из запросов пересчитает её заранее, до истечения.
+    """
+    early = compute_time * beta * -math.log(1.0 - random.random())
+    return time.time() + early >= fresh_until
+
+
+def _compute(key, compute, timeout, last=None):
+    started = time.time()
+    response = compute()
+    if response.status_code == 200 and not response.cookies:
+        compute_time = time.time() - started
+        entries = {key: (response, time.time() + timeout, compute_time)}
+        if last:
+            entries[last] = response
+        cache.set_many(entries, timeout + settings.PAGE_CACHE_STALE)
+    return response
+
+
+def get_or_compute(key, compute, timeout, last=None):
+    """Отдаёт страницу из кэша, пересчитывая её не более чем в одном процессе.
+
+    Просроченная копия продолжает отдаваться, пока единственный владелец
+    блокировки строит новую (stale-while-revalidate). Если под ключом
+    ``key`` копии нет, например после смены поколения, отдаётся последняя
+    версия из ключа ``last``. Если нет и её, остальные процессы немного
+    ждут результата вместо того, чтобы одновременно идти в базу с одним
+    и тем же запросом.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        response, fresh_until, compute_time = entry
+        if not _should_refresh(fresh_until, compute_time):
+            return response
+    lock = LOCK_PREFIX + key
+    if cache.add(lock, 1, settings.PAGE_CACHE_LOCK_TIMEOUT):
+        try:
+            return _compute(key, compute, timeout, last)
+        finally:
+            cache.delete(lock)
+    if entry is not None:
+        return entry[0]
+    previous = cache.get(last) if last else None
+    if previous is not None:
+        return previous
+    deadline = time.time() + settings.PAGE_CACHE_LOCK_WAIT
+    while time.time() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return compute()
+
+
+def cache_versioned(*scopes, timeout=None):
+    """Кэширует GET-ответы view до смены поколения любой из областей.
+
+    Области задаются строками формата с именованными аргументами view,
+    например ``'group:{slug}'``, или функциями от тех же аргументов.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            # Профиль запроса (?__profile=1) снимается с построения страницы
+            if (request.method not in ('GET', 'HEAD')
+                    or getattr(request, 'profiling', False)):
+                return view(request, *args, **kwargs)
+            key = page_key(request, [
+                scope(**kwargs) if callable(scope) else scope.format(**kwargs)
+                for scope in scopes
+            ])
+            return get_or_compute(
+                key,
+                lambda: view(request, *args, **kwargs),
+                timeout or settings.PAGE_CACHE_TIMEOUT,
+                last_key(request),
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,143 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарным UPDATE ... SET x = x + 1 из сигналов
+сохранения и удаления и не опускаются ниже нуля, а команда
+``recount_counters`` пересчитывает их целиком и исправляет расхождения.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# (модель, поле счётчика, что считаем, поле связи, ключ строки)
+COUNTERS = (
+    (Group, 'posts_count', Post, 'group', 'pk'),
+    (Post, 'comments_count', Comment, 'post', 'pk'),
+    (AuthorStats, 'posts_count', Post, 'author', 'user_id'),
+    (AuthorStats, 'followers_count', Follow, 'author', 'user_id'),
+    (AuthorStats, 'following_count', Follow, 'user', 'user_id'),
+)
+
+
+def _deltas(**deltas):
+    # Разошедшийся счётчик не должен превращать удаление в ошибку CHECK:
+    # до нуля он обрезается, а точное значение вернёт repair
+    return {
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    }
+
+
+def recount_user(user_id):
+    """Пересчитывает счётчики пользователя по исходным таблицам."""
+    values = {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+    stats, _ = AuthorStats.objects.update_or_create(
+        user_id=user_id, defaults=values
+    )
+    return stats
+
+
+def stats_for(user):
+    """Счётчики пользователя; отсутствующая строка создаётся пересчётом."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def stats_by_id(user_id):
+    stats = AuthorStats.objects.filter(user_id=user_id).first()
+    return stats or recount_user(user_id)
+
+
+def bump_user(user_id, **deltas):
+    # Строки может ещё не быть: тогда её создаст пересчёт при чтении
+    AuthorStats.objects.filter(user_id=user_id).update(**_deltas(**deltas))
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            **_deltas(posts_count=delta)
+        )
+
+
+def bump_post(post_id, delta):
+    Post.objects.filter(pk=post_id).update(**_deltas(comments_count=delta))
+
+
+def post_created(post):
+    with transaction.atomic():
+        bump_user(post.author_id, posts_count=1)
+        bump_group(post.group_id, 1)
+
+
+def post_deleted(post):
+    with transaction.atomic():
+        bump_user(post.author_id, posts_count=-1)
+        bump_group(post.group_id, -1)
+
+
+def post_moved(old_group_id, new_group_id):
+    with transaction.atomic():
+        bump_group(old_group_id, -1)
+        bump_group(new_group_id, 1)
+
+
+def follow_changed(follow, delta):
+    with transaction.atomic():
+        bump_user(follow.author_id, followers_count=delta)
+        bump_user(follow.user_id, following_count=delta)
+
+
+def comment_changed(comment, delta):
+    bump_post(comment.post_id, delta)
+
+
+def _actual(source, relation, key):
+    counted = (
+        source.objects.filter(**{relation: OuterRef(key)})
+        .order_by()
+        .values(relation)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted), 0)
+
+
+def repair(fix=True):
+    """Сверяет все счётчики с исходными таблицами.
+
+    Возвращает число расходящихся строк по каждому счётчику; при ``fix``
+    расхождения исправляются одним UPDATE на счётчик.
+    """
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True
+    )
+    if fix:
+        AuthorStats.objects.bulk_create(
+            [AuthorStats(user_id=pk) for pk in missing.iterator()],
+            batch_size=500,
+        )
+    report = {}
+    for model, field, source, relation, key in COUNTERS:
+        actual = _actual(source, relation, key)
+        drifted = model.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')}
+        )
+        name = f'{model._meta.model_name}.{field}'
+        report[name] = drifted.count()
+        if fix and report[name]:
+            with transaction.atomic():
+                model.objects.filter(
+                    pk__in=drifted.values('pk')
+                ).update(**{field: actual})
+    return report
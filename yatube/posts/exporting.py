@@ -0,0 +1,52 @@
+"""Потоковая выгрузка постов автора или группы в JSONL и CSV.
+
+Посты читаются через values().iterator() пачками, без создания объектов
+модели, и сразу превращаются в строки, поэтому память не зависит от
+числа постов. Поля совпадают с теми, что понимает import_data.
+"""
+import csv
+import json
+
+from .models import Post
+
+FORMATS = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+FIELDS = ('id', 'author', 'group', 'text', 'pub_date', 'image')
+CHUNK_SIZE = 2000
+
+
+def post_rows(**filters):
+    """Словари постов в порядке публикации, без объектов модели."""
+    rows = Post.objects.filter(**filters).order_by('pub_date', 'pk')
+    rows = rows.values_list(
+        'id', 'author__username', 'group__slug', 'text', 'pub_date', 'image'
+    ).iterator(chunk_size=CHUNK_SIZE)
+    for row in rows:
+        yield dict(zip(FIELDS, row))
+
+
+class _Line:
+    """Файл для csv.writer, который просто возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def as_csv(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        row['pub_date'] = row['pub_date'].isoformat()
+        yield writer.writerow([row[field] for field in FIELDS])
+
+
+def as_jsonl(rows):
+    for row in rows:
+        row['pub_date'] = row['pub_date'].isoformat()
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def serialize(rows, fmt):
+    return as_csv(rows) if fmt == 'csv' else as_jsonl(rows)
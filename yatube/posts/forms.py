@@ -1,9 +1,29 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
 
+from .images import normalize
 from .models import Post, Comment
 
 
 class PostForm(forms.ModelForm):
+    def __init__(self, *args, oversized=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Файл отброшен LimitedUploadHandler ещё при чтении запроса
+        self.oversized = oversized
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if self.oversized:
+            raise forms.ValidationError(
+                'Файл слишком большой: не больше %(limit)s',
+                params={'limit': filesizeformat(settings.MAX_UPLOAD_SIZE)},
+            )
+        if isinstance(image, UploadedFile):
+            return normalize(image)
+        return image
+
     class Meta:
         model = Post
         fields = ('group', 'text', 'image')
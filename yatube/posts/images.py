@@ -0,0 +1,51 @@
+"""Приведение загруженной картинки поста к хранимому виду.
+
+Картинка поворачивается по EXIF, уменьшается до POST_IMAGE_MAX_SIZE и
+пересжимается без метаданных (EXIF, в том числе геометки, комментарии).
+Формат сохраняется, если это JPEG, PNG или GIF; остальное переводится в
+JPEG или, при прозрачности, в PNG. Анимированные GIF не трогаются.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+}
+
+
+def save_options(fmt):
+    if fmt == 'JPEG':
+        return {'quality': settings.POST_IMAGE_QUALITY, 'optimize': True,
+                'progressive': True}
+    if fmt == 'PNG':
+        return {'optimize': True}
+    return {}
+
+
+def normalize(upload):
+    """Новый файл для сохранения вместо загруженного ``upload``."""
+    upload.seek(0)
+    with Image.open(upload) as source:
+        if getattr(source, 'is_animated', False):
+            upload.seek(0)
+            return upload
+        fmt = source.format if source.format in EXTENSIONS else None
+        image = ImageOps.exif_transpose(source)
+    image.thumbnail(settings.POST_IMAGE_MAX_SIZE, Image.LANCZOS)
+    if fmt is None:
+        transparent = (image.mode in ('RGBA', 'LA')
+                       or 'transparency' in image.info)
+        fmt = 'PNG' if transparent else 'JPEG'
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **save_options(fmt))
+    name = f'{os.path.splitext(upload.name)[0]}.{EXTENSIONS[fmt]}'
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              f'image/{fmt.lower()}')
@@ -0,0 +1,355 @@
+"""Нагрузочный прогон страниц постов с задержками по каждому view.
+
+Каждый поток или процесс изображает одного посетителя: по таблице весов
+ACTIONS выбирает очередную страницу, а с вероятностью ``logged_in`` делает
+запрос от имени своего пользователя ``load-<номер>`` — тогда в смеси есть
+лента подписок, подписки, комментарии и новые посты. Выбор страниц и
+целей задаётся seed, так что прогоны с теми же параметрами повторяют
+одну и ту же последовательность запросов.
+
+Запросы идут либо на работающий сервер по HTTP, либо прямо в WSGI-обработчик
+Django в том же процессе (тестовый клиент, без сети).
+
+Пишущие действия меняют базу: гонять прогон стоит на копии с данными из
+seed_data, а не на рабочей базе.
+"""
+import math
+import platform
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlsplit
+from urllib.request import (HTTPCookieProcessor, HTTPRedirectHandler,
+                            Request, build_opener)
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections
+from django.test import Client
+from django.urls import Resolver404, resolve, reverse
+from django.utils import timezone
+
+from .models import Group, Post
+from .seeding import WORDS, zipf_rank
+
+User = get_user_model()
+
+USER_PREFIX = 'load-'
+# Действие: вес у гостя и у вошедшего пользователя
+ACTIONS = {
+    'index': (40, 20),
+    'post_detail': (25, 20),
+    'profile': (15, 10),
+    'group_list': (10, 5),
+    'search': (5, 5),
+    'post_comments': (5, 5),
+    'follow_index': (0, 20),
+    'profile_follow': (0, 5),
+    'profile_unfollow': (0, 3),
+    'add_comment': (0, 5),
+    'post_create': (0, 2),
+}
+PERCENTILES = (50, 95, 99)
+
+
+class Targets:
+    """Посты, авторы и группы, по которым ходят посетители.
+
+    Свежие посты и группы идут первыми и выбираются чаще остальных.
+    """
+
+    def __init__(self, post_ids, usernames, slugs):
+        self.post_ids = post_ids
+        self.usernames = usernames
+        self.slugs = slugs
+
+    @classmethod
+    def load(cls, limit=1000):
+        posts = Post.objects.order_by('-pub_date', '-pk')[:limit]
+        post_ids = list(posts.values_list('pk', flat=True))
+        usernames = list(dict.fromkeys(
+            posts.values_list('author__username', flat=True)
+        ))
+        slugs = list(Group.objects.order_by('-pk')
+                     .values_list('slug', flat=True)[:limit])
+        if not post_ids:
+            raise ValueError('В базе нет постов: сначала запустите seed_data')
+        return cls(post_ids, usernames, slugs)
+
+
+def prepare_users(count, password=None):
+    """Создаёт пользователей ``load-1..count``.
+
+    Пароль нужен только для входа по HTTP; без него пароль непригоден, и
+    войти можно лишь в прогоне внутри процесса.
+    """
+    hashed = make_password(password)
+    names = [f'{USER_PREFIX}{number}' for number in range(1, count + 1)]
+    existing = set(User.objects.filter(username__in=names)
+                   .values_list('username', flat=True))
+    User.objects.bulk_create(
+        User(username=name, password=hashed)
+        for name in names if name not in existing
+    )
+    User.objects.filter(username__in=existing).update(password=hashed)
+    return names
+
+
+def disable_users(names):
+    """После прогона под пользователями ``load-N`` больше не войти."""
+    User.objects.filter(username__in=names).update(
+        password=make_password(None)
+    )
+
+
+class NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    """Посетитель работающего сервера: свои cookie, вход через форму."""
+
+    def __init__(self, base_url, username=None, password=None):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies),
+                                   NoRedirect)
+        if username:
+            self.login(username, password)
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def login(self, username, password):
+        path = reverse('users:login')
+        self.request('get', path)
+        status = self.request('post', path, {'username': username,
+                                             'password': password})
+        if status != 302:
+            raise RuntimeError(f'Не удалось войти как {username}')
+
+    def request(self, method, path, data=None):
+        url = self.base_url + path
+        body = None
+        if method == 'post':
+            data = dict(data or {}, csrfmiddlewaretoken=self.csrf_token())
+            body = urlencode(data).encode()
+        elif data:
+            url += '?' + urlencode(data)
+        request = Request(url, data=body, method=method.upper())
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                response.read()
+                return response.status
+        except HTTPError as error:
+            error.read()
+            return error.code
+        except URLError:
+            return 0
+
+
+class ClientSession:
+    """Посетитель в том же процессе: запросы идут прямо в обработчик Django."""
+
+    def __init__(self, username=None):
+        self.client = Client()
+        if username:
+            self.client.force_login(User.objects.get(username=username))
+
+    def request(self, method, path, data=None):
+        try:
+            response = getattr(self.client, method)(path, data or {})
+        except Exception:
+            return 500
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+
+class Visitor:
+    def __init__(self, options, targets, number):
+        self.rng = random.Random(f'{options["seed"]}:{number}')
+        self.targets = targets
+        self.logged_in = options['logged_in']
+        self.guest = self.session(options)
+        self.user = None
+        if self.logged_in:
+            self.user = self.session(options, f'{USER_PREFIX}{number}')
+
+    @staticmethod
+    def session(options, username=None):
+        if options['url']:
+            return HttpSession(options['url'], username, options['password'])
+        return ClientSession(username)
+
+    def pick(self, items):
+        return items[zipf_rank(self.rng, len(items), 1.1)]
+
+    def text(self, words):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words))
+
+    def next_request(self, as_user):
+        """Метод, адрес и данные очередного запроса."""
+        column = 1 if as_user else 0
+        names = [name for name, weights in ACTIONS.items()
+                 if weights[column]]
+        name = self.rng.choices(
+            names, [ACTIONS[name][column] for name in names]
+        )[0]
+        targets = self.targets
+        if name in ('post_detail', 'post_comments', 'add_comment'):
+            path = reverse(f'posts:{name}',
+                           args=(self.pick(targets.post_ids),))
+        elif name in ('profile', 'profile_follow', 'profile_unfollow'):
+            path = reverse(f'posts:{name}',
+                           args=(self.pick(targets.usernames),))
+        elif name == 'group_list':
+            if not targets.slugs:
+                return 'get', reverse('posts:index'), None
+            path = reverse('posts:group_list',
+                           args=(self.pick(targets.slugs),))
+        else:
+            path = reverse(f'posts:{name}')
+        if name == 'search':
+            return 'get', path, {'q': self.rng.choice(WORDS)}
+        if name == 'add_comment':
+            return 'post', path, {'text': self.text(8)}
+        if name == 'post_create':
+            return 'post', path, {'text': self.text(25)}
+        return 'get', path, None
+
+    def step(self):
+        """Выполняет один запрос: имя view, секунды, код ответа."""
+        as_user = self.user is not None and self.rng.random() < self.logged_in
+        method, path, data = self.next_request(as_user)
+        session = self.user if as_user else self.guest
+        started = time.perf_counter()
+        status = session.request(method, path, data)
+        elapsed = time.perf_counter() - started
+        return view_name(path), elapsed, status
+
+
+def view_name(path):
+    try:
+        return resolve(urlsplit(path).path).view_name
+    except Resolver404:
+        return 'unmatched'
+
+
+def run_visitor(options, targets, number, count):
+    visitor = Visitor(options, targets, number)
+    for _ in range(options['warmup']):
+        visitor.step()
+    return [visitor.step() for _ in range(count)]
+
+
+def _pooled_visitor(*args):
+    try:
+        return run_visitor(*args)
+    finally:
+        # Поток или процесс пула заканчивает работу: соединения не нужны
+        connections.close_all()
+
+
+def run(options, targets):
+    """Прогон целиком: список замеров и время в секундах."""
+    concurrency = options['concurrency']
+    share, extra = divmod(options['requests'], concurrency)
+    counts = [share + (number < extra) for number in range(concurrency)]
+    started = time.perf_counter()
+    if concurrency == 1:
+        samples = run_visitor(options, targets, 1, counts[0])
+        return samples, time.perf_counter() - started
+    if options['processes']:
+        # Дочерние процессы не должны унаследовать открытые соединения
+        connections.close_all()
+        pool = ProcessPoolExecutor(concurrency)
+    else:
+        pool = ThreadPoolExecutor(concurrency)
+    with pool:
+        futures = [
+            pool.submit(_pooled_visitor, options, targets, number + 1, count)
+            for number, count in enumerate(counts)
+        ]
+        samples = [sample for future in futures for sample in future.result()]
+    return samples, time.perf_counter() - started
+
+
+def percentile(ordered, q):
+    """Процентиль по ближайшему рангу из отсортированного списка."""
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def _stats(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    stats = {
+        'requests': len(ordered),
+        'errors': errors,
+        'throughput': round(len(ordered) / elapsed, 2) if elapsed else 0,
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2),
+    }
+    for q in PERCENTILES:
+        stats[f'p{q}_ms'] = round(percentile(ordered, q) * 1000, 2)
+    return stats
+
+
+def summarize(samples, elapsed):
+    """Пропускная способность и процентили задержки по каждому view.
+
+    Ошибкой считаются ответы 4xx и 5xx и отказы соединения;
+    перенаправления — обычный ответ пишущих view.
+    """
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for view, seconds, status in samples:
+        latencies[view].append(seconds)
+        if not 0 < status < 400:
+            errors[view] += 1
+    return {
+        'elapsed': round(elapsed, 3),
+        'total': _stats([seconds for _, seconds, _ in samples],
+                        sum(errors.values()), elapsed),
+        'views': {
+            view: _stats(latencies[view], errors[view], elapsed)
+            for view in sorted(latencies)
+        },
+    }
+
+
+def report(options, samples, elapsed):
+    """Результат для сохранения в JSON: параметры прогона и сводка."""
+    return {
+        'started': timezone.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {
+            key: options[key] for key in (
+                'url', 'requests', 'concurrency', 'processes', 'logged_in',
+                'warmup', 'seed',
+            )
+        },
+        **summarize(samples, elapsed),
+    }
+
+
+def compare(baseline, result):
+    """Изменение процентилей относительно прошлого прогона, в процентах."""
+    changes = {}
+    for view, stats in result['views'].items():
+        before = baseline.get('views', {}).get(view)
+        if not before:
+            continue
+        changes[view] = {
+            f'p{q}': round(
+                (stats[f'p{q}_ms'] / before[f'p{q}_ms'] - 1) * 100, 1
+            ) if before[f'p{q}_ms'] else None
+            for q in PERCENTILES
+        }
+    return changes
@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exporting import FORMATS, post_rows, serialize
+from posts.models import Group
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает посты автора или группы в JSONL или CSV'
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--author', help='Имя пользователя')
+        source.add_argument('--group', help='slug группы')
+        parser.add_argument('--format', choices=FORMATS, default='jsonl')
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Файл для выгрузки или - для stdout',
+        )
+
+    def handle(self, *args, **options):
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(f'Нет пользователя {options["author"]}')
+            filters = {'author': author}
+        else:
+            group = Group.objects.filter(slug=options['group']).first()
+            if group is None:
+                raise CommandError(f'Нет группы {options["group"]}')
+            filters = {'group': group}
+        if options['output'] == '-':
+            # Строки выгрузки уже заканчиваются переводом строки
+            self.stdout.ending = ''
+            stream = self.stdout
+        else:
+            stream = open(options['output'], 'w', newline='',
+                          encoding='utf-8')
+        try:
+            for chunk in serialize(post_rows(**filters), options['format']):
+                stream.write(chunk)
+        finally:
+            if stream is not self.stdout:
+                stream.close()
@@ -0,0 +1,55 @@
+import os
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import delete
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов, на которые не ссылается ни один пост, '
+            'вместе с их миниатюрами')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд: пост с ними '
+                 'может быть ещё не сохранён',
+        )
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        references = Counter(
+            Post.objects.exclude(image='').order_by()
+            .values_list('image', flat=True).iterator()
+        )
+        cutoff = time.time() - options['grace']
+        removed = freed = 0
+        for name in storage.walk(field.upload_to):
+            if references[name]:
+                continue
+            path = storage.path(name)
+            if os.path.getmtime(path) > cutoff:
+                continue
+            freed += os.path.getsize(path)
+            removed += 1
+            self.stdout.write(f'Сирота: {name}')
+            if not options['dry_run']:
+                # Вместе с файлом sorl удалит его миниатюры и свои записи
+                delete(name)
+        shared = sum(1 for count in references.values() if count > 1)
+        self.stdout.write(
+            f'Файлов в ссылках: {len(references)}, из них общих для '
+            f'нескольких постов: {shared}. Удалено сирот: {removed} '
+            f'({freed} байт)'
+        )
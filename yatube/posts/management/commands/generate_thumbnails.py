@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Готовит недостающие миниатюры уже загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.THUMBNAIL_WORKERS or 1,
+            help='Сколько постов обрабатывать параллельно',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пройти все посты с картинками, например после смены '
+                 'набора ширин: готовые миниатюры sorl не пересчитывает',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            # Без сохранённых размеров: миниатюр нет или они построены до
+            # появления этих полей — тогда sorl отдаст их без пересчёта
+            posts = posts.filter(thumbnail_width__isnull=True)
+        posts = posts.order_by().values_list('pk', flat=True).iterator()
+        queued = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for pk in posts:
+                pool.submit(thumbnails.run, pk)
+                queued += 1
+        self.stdout.write(f'Обработано постов: {queued}')
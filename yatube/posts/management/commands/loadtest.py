@@ -0,0 +1,106 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.loadtest import (PERCENTILES, Targets, compare, disable_users,
+                            prepare_users, report, run)
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон страниц постов: пропускная способность и '
+            'процентили задержки по каждому view')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Адрес работающего сервера; без него запросы идут в '
+                 'обработчик Django в этом же процессе',
+        )
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--processes',
+            action='store_true',
+            help='Посетители в отдельных процессах, а не в потоках',
+        )
+        parser.add_argument(
+            '--logged-in',
+            type=float,
+            default=0.3,
+            help='Доля запросов от вошедших пользователей (0..1)',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=0,
+            help='Запросов на посетителя до начала замеров',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--password',
+            help='Пароль пользователей load-N для входа по HTTP; после '
+                 'прогона их пароли становятся непригодными',
+        )
+        parser.add_argument('--output', help='Куда сохранить JSON с итогами')
+        parser.add_argument(
+            '--baseline',
+            help='JSON прошлого прогона для сравнения процентилей',
+        )
+
+    def check_options(self, options):
+        if not settings.DEBUG:
+            raise CommandError('Прогон создаёт пользователей и пишет в базу: '
+                               'запускайте его только при DEBUG на копии '
+                               'базы')
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('Нужны хотя бы один посетитель и один запрос')
+        if not 0 <= options['logged_in'] <= 1:
+            raise CommandError('--logged-in задаётся долей от 0 до 1')
+        if options['logged_in'] and options['url'] and not options['password']:
+            raise CommandError('Для входа по HTTP задайте --password')
+
+    def handle(self, *args, **options):
+        self.check_options(options)
+        try:
+            targets = Targets.load()
+        except ValueError as error:
+            raise CommandError(error)
+        names = []
+        if options['logged_in']:
+            names = prepare_users(options['concurrency'], options['password'])
+        try:
+            samples, elapsed = run(options, targets)
+        finally:
+            disable_users(names)
+        result = report(options, samples, elapsed)
+        self.print_table(result)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                self.print_changes(compare(json.load(file), result))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(result, file, ensure_ascii=False, indent=2,
+                          sort_keys=True)
+                file.write('\n')
+
+    def print_table(self, result):
+        columns = ['requests', 'errors', 'throughput'] + [
+            f'p{q}_ms' for q in PERCENTILES
+        ]
+        self.stdout.write(f'{"view":<24}' + ''.join(
+            f'{column:>12}' for column in columns
+        ))
+        rows = list(result['views'].items()) + [('total', result['total'])]
+        for view, stats in rows:
+            self.stdout.write(f'{view:<24}' + ''.join(
+                f'{stats[column]:>12}' for column in columns
+            ))
+
+    def print_changes(self, changes):
+        self.stdout.write('Изменение относительно прошлого прогона, %:')
+        for view, deltas in changes.items():
+            self.stdout.write(f'{view:<24}' + ''.join(
+                f'{name}={delta:+.1f} '
+                for name, delta in deltas.items() if delta is not None
+            ))
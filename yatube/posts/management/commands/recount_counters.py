@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import repair
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя',
+        )
+
+    def handle(self, *args, **options):
+        report = repair(fix=not options['check'])
+        for counter, drifted in report.items():
+            self.stdout.write(f'{counter}: {drifted}')
+        if options['check'] and any(report.values()):
+            self.stderr.write('Найдены расхождения в счётчиках')
@@ -0,0 +1,76 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts.importing import finish
+from posts.models import Comment, Follow, Group, Post
+from posts.seeding import Seeder, User, insert
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками со степенным '
+            'распределением активности')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help='Начало имён пользователей и slug групп',
+        )
+        parser.add_argument(
+            '--start',
+            default='2021-01-01',
+            help='Дата первого поста; посты распределены на --days дней',
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument(
+            '--alpha',
+            type=float,
+            default=1.1,
+            help='Показатель степенного закона: чем больше, тем сильнее '
+                 'активность сосредоточена у немногих',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        if options['comments'] and not options['posts']:
+            raise CommandError('Комментариям нужны посты: задайте --posts')
+        start = timezone.make_aware(
+            datetime.strptime(options['start'], '%Y-%m-%d')
+        )
+        seeder = Seeder(seed=options['seed'], prefix=options['prefix'],
+                        start=start, days=options['days'],
+                        alpha=options['alpha'])
+        batch_size = options['batch_size']
+        steps = (
+            (User, seeder.make_users, 'users', None),
+            (Group, seeder.make_groups, 'groups', None),
+            (Post, seeder.make_posts, 'posts', 'pub_date'),
+            (Comment, seeder.make_comments, 'comments', 'created'),
+            (Follow, seeder.make_follows, 'follows', None),
+        )
+        for model, make, option, date_field in steps:
+            started = time.monotonic()
+            total = insert(model, make(options[option]), batch_size,
+                           date_field)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'{option}: {total} за {elapsed:.1f} с '
+                f'({total / elapsed if elapsed else 0:.0f} строк/с)'
+            )
+        started = time.monotonic()
+        finish('posts', batch_size)
+        self.stdout.write(
+            f'Счётчики, ленты и поиск: {time.monotonic() - started:.1f} с'
+        )
@@ -0,0 +1,144 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (IntegrityError, OperationalError, connections,
+                       transaction)
+from django.db.models import Max
+from django.test.utils import override_settings
+
+from core.sqlite import PRAGMAS, apply_pragmas
+from posts.loadtest import percentile
+from posts.models import Comment, Post
+
+PROFILES = ('default', 'production')
+
+
+def copy_database(source, profile):
+    """Копия базы через backup API, чтобы замер не трогал рабочую."""
+    handle, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(handle)
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(path)
+    try:
+        src.backup(dst)
+        # Режим журнала хранится в самом файле
+        mode = PRAGMAS['journal_mode'] if profile == 'production' else 'DELETE'
+        dst.execute(f'PRAGMA journal_mode = {mode}')
+    finally:
+        src.close()
+        dst.close()
+    return path
+
+
+def worker(path, profile, duration, write_share, seed):
+    """Цикл чтений и записей в дочернем процессе.
+
+    Профиль по умолчанию открывает соединение на каждую операцию, как
+    Django без CONN_MAX_AGE открывает его на каждый запрос. Записи идут
+    через bulk_create: он не шлёт сигналов, так что замер не трогает
+    общий кэш страниц и меряет только саму базу.
+    """
+    rng = random.Random(seed)
+    db = connections['default']
+    db.settings_dict['NAME'] = path
+    db.settings_dict['OPTIONS'] = {}
+    top = Post.objects.aggregate(top=Max('pk'))['top']
+    users = list(Post.objects.values_list('author_id', flat=True)[:1000])
+    if profile == 'production':
+        apply_pragmas(db)
+    stats = {'read': [], 'write': [], 'errors': 0, 'integrity': 0}
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        kind = 'write' if rng.random() < write_share else 'read'
+        started = time.perf_counter()
+        try:
+            if kind == 'read':
+                offset = rng.randrange(0, 500, 10)
+                list(Post.objects.select_related('author', 'group')
+                     .order_by('-pub_date')[offset:offset + 10])
+            elif rng.random() < 0.8:
+                with transaction.atomic():
+                    Comment.objects.bulk_create([Comment(
+                        post_id=rng.randint(1, top),
+                        author_id=rng.choice(users),
+                        text='Комментарий из замера',
+                    )])
+            else:
+                with transaction.atomic():
+                    Post.objects.bulk_create([Post(
+                        author_id=rng.choice(users), text='Пост из замера'
+                    )])
+        except OperationalError:
+            stats['errors'] += 1
+        except IntegrityError:
+            # Например, комментарий к посту, удалённому из базы
+            stats['integrity'] += 1
+        else:
+            stats[kind].append(time.perf_counter() - started)
+        if profile == 'default':
+            db.close()
+    db.close()
+    return stats
+
+
+class Command(BaseCommand):
+    help = ('Пропускная способность чтения и записи в SQLite из нескольких '
+            'процессов: профиль по умолчанию против боевого (core.sqlite)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Секунд на каждый профиль')
+        parser.add_argument('--writes', type=float, default=0.2,
+                            help='Доля пишущих операций (0..1)')
+        parser.add_argument('--profile', choices=PROFILES + ('both',),
+                            default='both')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        source = settings.DATABASES['default']['NAME']
+        if not Post.objects.exists():
+            raise CommandError('В базе нет постов: сначала запустите '
+                               'seed_data')
+        profiles = (PROFILES if options['profile'] == 'both'
+                    else (options['profile'],))
+        # Запросы к копии не должны попасть в общую статистику slow_queries
+        with override_settings(SLOW_QUERY_LOG=False):
+            for profile in profiles:
+                connections.close_all()
+                path = copy_database(source, profile)
+                try:
+                    self.run(profile, path, options)
+                finally:
+                    for suffix in ('', '-wal', '-shm', '-journal'):
+                        if os.path.exists(path + suffix):
+                            os.remove(path + suffix)
+
+    def run(self, profile, path, options):
+        duration = options['duration']
+        args = [
+            (path, profile, duration, options['writes'],
+             options['seed'] * 1000 + number)
+            for number in range(options['workers'])
+        ]
+        context = multiprocessing.get_context('fork')
+        with context.Pool(options['workers']) as pool:
+            results = pool.starmap(worker, args)
+        reads = sorted(t for result in results for t in result['read'])
+        writes = sorted(t for result in results for t in result['write'])
+        errors = sum(result['errors'] for result in results)
+        integrity = sum(result['integrity'] for result in results)
+        line = (f'{profile:<11} чтений {len(reads) / duration:8.1f}/с  '
+                f'записей {len(writes) / duration:7.1f}/с  '
+                f'ошибок блокировки {errors}  целостности {integrity}')
+        for name, values in (('чтение', reads), ('запись', writes)):
+            if values:
+                line += (f'  {name} p95 '
+                         f'{percentile(values, 95) * 1000:.1f} мс')
+        self.stdout.write(line)
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.storage import content_storage
+
 User = get_user_model()
 
 
@@ -8,6 +10,7 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
@@ -18,6 +21,8 @@ class Post(models.Model):
                             help_text='Введите текст')
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации')
+    updated = models.DateTimeField(auto_now=True,
+                                   verbose_name='Дата изменения')
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -36,11 +41,24 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=content_storage,
         blank=True
     )
+    # Размеры готовой миниатюры; пусто, пока её не построили в фоне
+    thumbnail_width = models.PositiveIntegerField(null=True, editable=False)
+    thumbnail_height = models.PositiveIntegerField(null=True, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['-pub_date']
+        # Ленты фильтруют по одному полю и сортируют по дате: составной
+        # индекс читается в обратном порядке без сортировки во временном
+        # B-дереве, а rowid в конце индекса задаёт порядок при равных датах
+        indexes = [
+            models.Index(fields=['pub_date']),
+            models.Index(fields=['author', 'pub_date']),
+            models.Index(fields=['group', 'pub_date']),
+        ]
 
     def __str__(self):
         return f'{self.text[:15]}'
@@ -60,6 +78,11 @@ class Comment(models.Model):
                                    auto_now_add=True,
                                    db_index=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created']),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User,
@@ -72,3 +95,37 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ("user", "author")
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, которые иначе пришлось бы считать COUNT(*)."""
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name="stats")
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: запись на каждый пост автора,
+    разосланная подписчику при публикации или при подписке."""
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name="timeline")
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name="timeline_entries")
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name="+")
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date']
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(fields=['user', 'pub_date']),
+            models.Index(fields=['user', 'author']),
+        ]
@@ -0,0 +1,145 @@
+"""Постраничный вывод по ключу (дата, id) без COUNT(*) и OFFSET.
+
+Курсор — непрозрачная строка с ключом крайней записи страницы и
+направлением. Обычные ссылки ``?page=N`` продолжают работать через
+стандартный Paginator, а переход дальше идёт по курсорам.
+"""
+import base64
+import binascii
+import json
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(value, pk, backwards=False):
+    if value is not None:
+        value = value.isoformat()
+    raw = json.dumps([value, pk, backwards]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (value, pk, backwards) или None для испорченного курсора."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        value, pk, backwards = json.loads(raw.decode())
+        if value is not None:
+            if not isinstance(value, str) or not isinstance(pk, int):
+                return None
+            # Дата в верном формате, но несуществующая, даёт ValueError
+            value = parse_datetime(value)
+            if value is None:
+                return None
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    return value, pk, bool(backwards)
+
+
+# Курсор на последнюю страницу: с конца списка, без ключа
+LAST_CURSOR = encode_cursor(None, None, backwards=True)
+
+
+class CursorPage(Page):
+    """Страница без номера: соседние страницы доступны только по курсорам."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class CursorPaginator(Paginator):
+    """Paginator, который ищет страницу по ключу, а не по смещению.
+
+    ``key`` — атрибут объекта с датой. Поле для фильтрации и направление
+    берутся из сортировки queryset: так лента подписок листается по
+    дате записи в ленте, а не по дате поста.
+    """
+
+    def __init__(self, object_list, per_page, key='pub_date'):
+        super().__init__(object_list, per_page)
+        self.key = key
+        ordering = (object_list.query.order_by
+                    or object_list.model._meta.ordering or [key])
+        self.lookup = ordering[0].lstrip('-')
+        self.descending = ordering[0].startswith('-')
+
+    def cursor_after(self, obj):
+        return encode_cursor(getattr(obj, self.key), obj.pk)
+
+    def cursor_before(self, obj):
+        return encode_cursor(getattr(obj, self.key), obj.pk, backwards=True)
+
+    def _ordered(self, backwards):
+        reverse = self.descending != backwards
+        prefix = '-' if reverse else ''
+        return self.object_list.order_by(prefix + self.lookup, prefix + 'pk')
+
+    def _after(self, value, pk, backwards):
+        op = 'lt' if self.descending != backwards else 'gt'
+        return (
+            Q(**{f'{self.lookup}__{op}': value})
+            | Q(**{self.lookup: value, f'pk__{op}': pk})
+        )
+
+    def get_cursor_page(self, token):
+        cursor = decode_cursor(token) if token else None
+        if cursor is None:
+            value, pk, backwards = None, None, False
+        else:
+            value, pk, backwards = cursor
+        queryset = self._ordered(backwards)
+        if value is not None:
+            queryset = queryset.filter(self._after(value, pk, backwards))
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = value is not None, more
+        else:
+            has_next, has_previous = more, value is not None
+        page = CursorPage(rows, self, has_next, has_previous)
+        self.annotate_page(page)
+        return page
+
+    def annotate_page(self, page):
+        """Проставляет странице курсоры на соседние страницы."""
+        rows = page.object_list
+        page.next_cursor = (
+            self.cursor_after(rows[-1]) if rows and page.has_next() else ''
+        )
+        page.previous_cursor = (
+            self.cursor_before(rows[0])
+            if rows and page.has_previous() and page.number is None else ''
+        )
+        page.last_cursor = LAST_CURSOR
+
+
+def paginate(request, object_list, per_page, count=None, **keyset):
+    """Страница по ``?cursor=`` либо по номеру ``?page=N``.
+
+    ``count`` — известное заранее число записей, чтобы не делать COUNT(*).
+    """
+    paginator = CursorPaginator(object_list, per_page, **keyset)
+    token = request.GET.get('cursor')
+    if token:
+        return paginator.get_cursor_page(token)
+    numbered = Paginator(object_list, per_page)
+    if count is not None:
+        numbered.count = count
+    page = numbered.get_page(request.GET.get('page'))
+    page.object_list = list(page.object_list)
+    paginator.annotate_page(page)
+    return page
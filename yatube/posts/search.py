@@ -0,0 +1,161 @@
+"""Полнотекстовый поиск по постам через виртуальную таблицу SQLite FTS5.
+
+Таблица ``posts_post_fts`` хранит текст поста под rowid, равным id поста,
+и обновляется сигналами сохранения и удаления Post. На других СУБД поиск
+откатывается к LIKE по тексту.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+# Таблица создаётся миграцией 0012_post_search
+TABLE = 'posts_post_fts'
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def fold(text):
+    """«ё» и «е» ищутся одинаково: unicode61 их не отождествляет."""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Запрос пользователя в синтаксисе FTS5: все слова, последнее — префиксом.
+
+    Операторы FTS5 из ввода не пропускаются: каждое слово берётся в кавычки.
+    """
+    terms = _TERM.findall(fold(query))
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def index_post(post):
+    if available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post.pk])
+            cursor.execute(
+                f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)',
+                [post.pk, fold(post.text)]
+            )
+
+
+def unindex_post(post_id):
+    if available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild(batch_size=1000):
+    """Заново заполняет индекс, читая посты пачками. Возвращает их число."""
+    total = 0
+    rows = Post.objects.order_by().values_list('pk', 'text').iterator(
+        chunk_size=batch_size
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    batch = []
+    for pk, text in rows:
+        batch.append((pk, fold(text)))
+        if len(batch) == batch_size:
+            total += _insert(batch)
+            batch = []
+    if batch:
+        total += _insert(batch)
+    return total
+
+
+def _insert(batch):
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)', batch
+        )
+    return len(batch)
+
+
+def matching_ids(query, limit=None, offset=0):
+    """id постов, подходящих под запрос, от самых релевантных (bm25)."""
+    expression = match_expression(query)
+    if not expression:
+        return []
+    sql = f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY rank'
+    params = [expression]
+    if limit is not None:
+        sql += ' LIMIT %s OFFSET %s'
+        params += [limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def count(query):
+    expression = match_expression(query)
+    if not expression:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT COUNT(*) FROM {TABLE} WHERE {TABLE} MATCH %s',
+            [expression]
+        )
+        return cursor.fetchone()[0]
+
+
+class _Rowids(RawSQL):
+    """Подзапрос для ``pk__in``: в Django 2.2 поиск IN сам берёт
+    выражение в скобки, а вторые скобки SQLite понял бы как одно значение."""
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def filter_posts(queryset, query):
+    """Ограничивает queryset постами, найденными по запросу.
+
+    Поиск идёт подзапросом в той же базе: широкий запрос не превращается
+    в огромный список id в IN.
+    """
+    if not available():
+        return queryset.filter(text__icontains=query)
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    return queryset.filter(pk__in=_Rowids(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [expression]
+    ))
+
+
+class SearchResults:
+    """Ленивый список результатов для Paginator: COUNT и LIMIT идут в FTS,
+    а сами посты загружаются одним запросом на страницу."""
+
+    def __init__(self, query, queryset=None):
+        self.query = query
+        if queryset is None:
+            queryset = Post.objects.all()
+        self.queryset = queryset
+
+    def count(self):
+        if available():
+            return count(self.query)
+        return filter_posts(self.queryset, self.query).count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        if not available():
+            return list(filter_posts(self.queryset, self.query)[index])
+        ids = matching_ids(self.query, index.stop - start, start)
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
@@ -0,0 +1,158 @@
+"""Синтетические данные для нагрузочных замеров.
+
+Распределения степенные, как у настоящих сообществ: немногие авторы пишут
+большую часть постов, немногие посты собирают большую часть комментариев,
+а на немногих авторов подписана большая часть читателей. Всё задаётся
+одним seed: при тех же параметрах получаются те же строки.
+
+Объекты создаются генераторами с заранее известными id и вставляются
+bulk_create пачками, так что связи не нужно перечитывать из базы.
+"""
+import math
+import random
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .importing import chunked, explicit_date
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = (
+    'лес река город дорога утро вечер книга письмо друг дом окно поле '
+    'ветер снег солнце море песня память время работа история вопрос '
+    'ответ встреча путь небо свет голос сад мост ночь день мир слово'
+).split()
+
+
+def zipf_rank(rng, n, alpha):
+    """Номер от 0 до n - 1, вероятность которого убывает как 1 / k^alpha.
+
+    Обратное преобразование непрерывного степенного закона: память не
+    зависит от n, в отличие от random.choices с весами.
+    """
+    u = rng.random()
+    if alpha == 1:
+        rank = (n + 1) ** u
+    else:
+        power = 1 - alpha
+        rank = (((n + 1) ** power - 1) * u + 1) ** (1 / power)
+    return min(int(rank) - 1, n - 1)
+
+
+def scatter(rank, n, step=7919):
+    """Перестановка номеров 0..n-1 без хранения: rank * step по модулю n."""
+    while math.gcd(step, n) != 1:
+        step += 1
+    return rank * step % n
+
+
+class Seeder:
+    def __init__(self, seed=1, prefix='seed', start=None, days=365,
+                 alpha=1.1):
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.start = start or timezone.make_aware(datetime(2021, 1, 1))
+        self.span = timedelta(days=days)
+        self.alpha = alpha
+        # Войти под сгенерированными пользователями нельзя
+        self.password = UNUSABLE_PASSWORD_PREFIX + prefix
+        self.users = self.groups = self.posts = range(0)
+
+    def next_ids(self, model, count):
+        first = (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+        return range(first, first + count)
+
+    def text(self, mean_words=25):
+        count = max(1, int(self.rng.lognormvariate(0, 0.8) * mean_words))
+        return ' '.join(self.rng.choice(WORDS) for _ in range(count))
+
+    def pick(self, ids, scattered=False):
+        """Случайный элемент ``ids``, первые встречаются чаще остальных.
+
+        ``scattered`` переставляет порядок популярности, чтобы, например,
+        самые читаемые авторы не совпадали с самыми пишущими.
+        """
+        rank = zipf_rank(self.rng, len(ids), self.alpha)
+        if scattered:
+            rank = scatter(rank, len(ids))
+        return ids[rank]
+
+    def make_users(self, count):
+        self.users = self.next_ids(User, count)
+        for pk in self.users:
+            yield User(pk=pk, username=f'{self.prefix}{pk}',
+                       password=self.password,
+                       date_joined=self.start)
+
+    def make_groups(self, count):
+        self.groups = self.next_ids(Group, count)
+        for pk in self.groups:
+            yield Group(pk=pk, title=f'Группа {pk}',
+                        slug=f'{self.prefix}-group-{pk}',
+                        description=self.text(10))
+
+    def make_posts(self, count):
+        """Посты идут по времени: чем больше id, тем позже дата."""
+        self.posts = self.next_ids(Post, count)
+        for index, pk in enumerate(self.posts):
+            in_group = self.groups and self.rng.random() < 0.6
+            yield Post(
+                pk=pk,
+                author_id=self.pick(self.users),
+                group_id=self.pick(self.groups) if in_group else None,
+                text=self.text(),
+                pub_date=self.start + self.span * (index / count),
+            )
+
+    def make_comments(self, count):
+        """Больше всего комментариев у свежих постов."""
+        newest_first = self.posts[::-1]
+        end = self.start + self.span
+        for _ in range(count):
+            post_id = self.pick(newest_first)
+            index = post_id - self.posts[0]
+            posted = self.start + self.span * (index / len(self.posts))
+            delay = timedelta(minutes=self.rng.expovariate(1 / 120))
+            yield Comment(post_id=post_id,
+                          author_id=self.pick(self.users),
+                          text=self.text(8),
+                          created=min(posted + delay, end))
+
+    def make_follows(self, count):
+        """Число подписок у читателя тоже распределено с тяжёлым хвостом;
+        в сумме выходит примерно ``count``.
+
+        Популярность авторов не связана с их плодовитостью: иначе у
+        каждой подписки были бы тысячи постов и ленты подписок
+        разрастались бы на порядки.
+        """
+        mean = count / len(self.users)
+        for user_id in self.users:
+            # Среднее распределения Парето с alpha = 1.5 равно 3
+            wanted = int(self.rng.paretovariate(1.5) * mean / 3)
+            authors = set()
+            for _ in range(min(wanted, len(self.users) - 1) * 2):
+                author_id = self.pick(self.users, scattered=True)
+                if author_id != user_id:
+                    authors.add(author_id)
+                if len(authors) >= wanted:
+                    break
+            for author_id in sorted(authors):
+                yield Follow(user_id=user_id, author_id=author_id)
+
+
+def insert(model, objects, batch_size, date_field=None):
+    """Вставляет объекты пачками, каждую в своей транзакции."""
+    total = 0
+    with explicit_date(model, date_field):
+        for chunk in chunked(objects, batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(chunk)
+            total += len(chunk)
+    return total
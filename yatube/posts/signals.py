@@ -0,0 +1,127 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.replica import replica_synced
+
+from . import counters, search, thumbnails, timeline
+from .cache import bump, bump_post
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+# Поля пользователя, которые видны на страницах постов
+SHOWN_USER_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    instance._old_group_id = instance._old_image = None
+    if instance.pk is not None:
+        instance._old_group_id, instance._old_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first() or (None, None)
+        )
+    if instance.image.name != instance._old_image:
+        # Миниатюра прежней картинки больше не подходит
+        instance.thumbnail_width = instance.thumbnail_height = None
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.post_created(instance)
+        timeline.fan_out(instance)
+    elif instance._old_group_id != instance.group_id:
+        counters.post_moved(instance._old_group_id, instance.group_id)
+    search.index_post(instance)
+    if instance.image and instance.image.name != instance._old_image:
+        post_id = instance.pk
+        transaction.on_commit(lambda: thumbnails.schedule(post_id))
+    bump_post(instance, instance._old_group_id, instance.group_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.post_deleted(instance)
+    search.unindex_post(instance.pk)
+    bump_post(instance, instance.group_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump('groups')
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.comment_changed(instance, 1)
+    bump(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.comment_changed(instance, -1)
+    bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.follow_changed(instance, 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+    bump(f'profile:{instance.author.username}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.follow_changed(instance, -1)
+    timeline.prune(instance.user_id, instance.author_id)
+    followers = counters.stats_by_id(instance.author_id).followers_count
+    if followers == settings.TIMELINE_FANOUT_LIMIT:
+        # Автор только что опустился до лимита рассылки
+        timeline.author_returned(instance.author_id)
+    bump(f'profile:{instance.author.username}')
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, update_fields=None, **kwargs):
+    instance._old_shown = None
+    if instance.pk is None:
+        return
+    if update_fields and not set(update_fields) & set(SHOWN_USER_FIELDS):
+        # Например, last_login при каждом входе
+        return
+    instance._old_shown = User.objects.filter(pk=instance.pk).values_list(
+        *SHOWN_USER_FIELDS
+    ).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    old = getattr(instance, '_old_shown', None)
+    shown = tuple(getattr(instance, name) for name in SHOWN_USER_FIELDS)
+    if created or old is None or old == shown:
+        return
+    # Имя автора есть в лентах, на его профиле и страницах его постов,
+    # а логин — ещё и в комментариях к чужим постам
+    slugs = Group.objects.filter(posts__author=instance).values_list(
+        'slug', flat=True
+    ).distinct()
+    scopes = ['index', f'profile:{old[0]}', f'profile:{instance.username}',
+              f'author:{instance.pk}', *[f'group:{slug}' for slug in slugs]]
+    if old[0] != instance.username:
+        scopes += [
+            f'post:{post_id}' for post_id in
+            Comment.objects.filter(author=instance)
+            .values_list('post_id', flat=True).distinct()
+        ]
+    bump(*scopes)
+
+
+@receiver(replica_synced)
+def replica_updated(sender, alias, **kwargs):
+    bump('replica')
@@ -0,0 +1,50 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import thumbnails
+from posts.cache import version_map
+
+register = template.Library()
+
+
+def card_key(post, variant, scopes):
+    stamp = post.updated.timestamp()
+    groups = scopes['groups']
+    author = scopes[f'author:{post.author_id}']
+    return f'posts:card:{variant}:{post.pk}:{stamp}:{groups}:{author}'
+
+
+@register.simple_tag
+def post_cards(posts, variant):
+    """Готовая разметка карточек постов страницы.
+
+    Все карточки достаются из кэша одним get_many; отсутствующие
+    рендерятся из ``posts/cards/<variant>.html`` и сохраняются set_many.
+    Ключ включает время изменения поста, так что правка поста сама
+    делает старую карточку ненужной, а также поколение автора: оно
+    меняется вместе с его именем.
+    """
+    posts = list(posts)
+    scopes = version_map(['groups', *{
+        f'author:{post.author_id}' for post in posts
+    }])
+    keys = [card_key(post, variant, scopes) for post in posts]
+    found = cache.get_many(keys)
+    thumbnails.preload(
+        [post for key, post in zip(keys, posts) if key not in found]
+    )
+    rendered = {}
+    cards = []
+    for key, post in zip(keys, posts):
+        card = found.get(key)
+        if card is None:
+            card = render_to_string(f'posts/cards/{variant}.html',
+                                    {'post': post})
+            rendered[key] = card
+        cards.append(mark_safe(card))
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+    return cards
@@ -0,0 +1,16 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Готовая миниатюра картинки поста или None, пока её готовят в фоне.
+
+    Ленты загружают миниатюры всей страницы заранее, см. ``post_cards``.
+    """
+    if not hasattr(post, 'thumbnail'):
+        thumbnails.preload([post])
+    return post.thumbnail
@@ -0,0 +1,228 @@
+import csv
+import io
+import json
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.importing import PostImporter, import_rows, read_rows
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ImportDataTests(TestCase):
+    def load(self, kind, fmt, content):
+        with tempfile.NamedTemporaryFile('w', suffix=f'.{fmt}',
+                                         encoding='utf-8') as source:
+            source.write(content)
+            source.flush()
+            out = io.StringIO()
+            call_command('import_data', kind, source.name,
+                         batch_size=2, stdout=out, stderr=self.errors)
+        return out.getvalue()
+
+    def setUp(self):
+        self.errors = io.StringIO()
+
+    def jsonl(self, *rows):
+        return '\n'.join(json.dumps(row, ensure_ascii=False) for row in rows)
+
+    def test_import_pipeline(self):
+        """Данные загружаются по ссылкам на имена и slug, а счётчики,
+        ленты и поиск пересчитываются после загрузки."""
+        self.load('users', 'csv', 'username,first_name\nleo,Лев\nanna,Анна\n')
+        self.load('groups', 'jsonl', self.jsonl(
+            {'title': 'Книги', 'slug': 'books', 'description': ''}))
+        self.load('follows', 'csv', 'user,author\nanna,leo\nleo,leo\n')
+        report = self.load('posts', 'jsonl', self.jsonl(
+            {'id': 100, 'author': 'leo', 'group': 'books',
+             'text': 'Война и мир', 'pub_date': '1869-01-01T00:00:00'},
+            {'author': 'leo', 'text': 'Анна Каренина'},
+            {'author': 'nobody', 'text': 'Пропадёт'},
+        ))
+        self.assertIn('Загружено: 2, пропущено: 1', report)
+        self.load('comments', 'csv',
+                  'post,author,text\n100,anna,Прочла\n999,anna,Мимо\n')
+
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.pub_date.year, 1869)
+        self.assertEqual(post.group.slug, 'books')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Group.objects.get(slug='books').posts_count, 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        leo = AuthorStats.objects.get(user__username='leo')
+        self.assertEqual((leo.posts_count, leo.followers_count), (2, 1))
+        anna = User.objects.get(username='anna')
+        self.assertEqual(anna.timeline.count(), 2)
+        self.assertEqual(Comment.objects.get().post_id, 100)
+        if search.available():
+            self.assertEqual(search.matching_ids('война'), [100])
+
+    def test_malformed_rows_skipped(self):
+        """Строки без полей, с неверным id или датой пропускаются."""
+        self.load('users', 'csv', 'username\nleo\n')
+        report = self.load('posts', 'jsonl', '\n'.join([
+            self.jsonl({'author': 'leo'}),
+            self.jsonl({'id': 'x', 'author': 'leo', 'text': 'Id'}),
+            self.jsonl({'author': 'leo', 'text': 'Дата', 'pub_date': 'вчера'}),
+            '{не json',
+            self.jsonl({'author': 'leo', 'text': 'Годный'}),
+        ]))
+        self.assertIn('Загружено: 1, пропущено: 4', report)
+        self.assertIn('Строка 1 пропущена: нет поля text',
+                      self.errors.getvalue())
+
+    def test_repeated_rows_skipped(self):
+        """Повторы имён, slug и id, в том числе при повторной загрузке
+        файла, пропускаются, а не обрывают импорт."""
+        users = 'username\nleo\nanna\nleo\n'
+        self.assertIn('Загружено: 2, пропущено: 1',
+                      self.load('users', 'csv', users))
+        self.assertIn('Загружено: 0, пропущено: 3',
+                      self.load('users', 'csv', users))
+        groups = self.jsonl({'title': 'Книги', 'slug': 'books'},
+                            {'title': 'Ещё книги', 'slug': 'books'})
+        self.assertIn('Загружено: 1, пропущено: 1',
+                      self.load('groups', 'jsonl', groups))
+        posts = self.jsonl(
+            {'id': 1, 'author': 'leo', 'text': 'Первый'},
+            {'id': 2, 'author': 'leo', 'text': 'Второй'},
+            {'id': 1, 'author': 'leo', 'text': 'Повтор id'},
+        )
+        self.assertIn('Загружено: 2, пропущено: 1',
+                      self.load('posts', 'jsonl', posts))
+        self.assertEqual(Post.objects.get(pk=1).text, 'Первый')
+
+    def test_aborted_import_still_repairs(self):
+        """После оборванной загрузки счётчики всё равно пересчитаны."""
+        self.load('users', 'csv', 'username\nleo\n')
+        content = self.jsonl(
+            {'id': 1, 'author': 'leo', 'text': 'Первый'},
+            {'id': 2, 'author': 'leo', 'text': 'Второй'},
+            {'id': 3, 'author': 'leo', 'text': 'Не дойдёт'},
+        )
+        check = PostImporter.check
+
+        def fail_second_batch(importer, objects):
+            if Post.objects.exists():
+                raise IntegrityError
+            return check(importer, objects)
+
+        with mock.patch.object(PostImporter, 'check', fail_second_batch):
+            with self.assertRaises(IntegrityError):
+                self.load('posts', 'jsonl', content)
+        stats = AuthorStats.objects.get(user__username='leo')
+        self.assertEqual(stats.posts_count, 2)
+        Post.objects.get(pk=1).delete()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='leo')
+        cls.group = Group.objects.create(title='Книги', slug='books',
+                                         description='')
+        for i in range(3):
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'Глава {i}, "цитата"')
+
+    def test_profile_export_jsonl(self):
+        response = self.client.get(
+            reverse('posts:profile_export', args=(self.author.username,)))
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in
+                b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['text'] for row in rows],
+                         [f'Глава {i}, "цитата"' for i in range(3)])
+        self.assertEqual(rows[0]['author'], 'leo')
+        self.assertEqual(rows[0]['group'], 'books')
+
+    def test_group_export_csv(self):
+        response = self.client.get(
+            reverse('posts:group_export', args=(self.group.slug,)),
+            {'format': 'csv'})
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[2]['text'], 'Глава 2, "цитата"')
+
+    def test_export_round_trip(self):
+        """Выгрузка команды читается import_data."""
+        out = io.StringIO()
+        call_command('export_posts', '--author=leo', stdout=out)
+        Post.objects.all().delete()
+        rows = list(read_rows(io.StringIO(out.getvalue()), 'jsonl'))
+        self.assertEqual(len(rows), 3)
+        import_rows('posts', rows)
+        self.assertEqual(Post.objects.filter(group=self.group).count(), 3)
+
+
+class SeedDataTests(TestCase):
+    def seed(self, prefix):
+        call_command('seed_data', '--users=20', '--groups=3', '--posts=60',
+                     '--comments=40', '--follows=30', f'--prefix={prefix}',
+                     stdout=io.StringIO())
+        users = User.objects.filter(username__startswith=prefix)
+        return (
+            list(Post.objects.filter(author__in=users).order_by('pk')
+                 .values_list('author__username', 'text', 'pub_date')),
+            list(Follow.objects.filter(user__in=users).order_by('pk')
+                 .values_list('user__username', 'author__username')),
+        )
+
+    def test_same_seed_same_data(self):
+        first = self.seed('a')
+        second = self.seed('b')
+        self.assertEqual(len(first[0]), 60)
+        # Имена отличаются префиксом и сдвигом id, остальное совпадает
+        self.assertEqual([post[1:] for post in first[0]],
+                         [post[1:] for post in second[0]])
+        self.assertEqual(len(first[1]), len(second[1]))
+        stats = AuthorStats.objects.filter(user__username__startswith='a')
+        self.assertEqual(sum(stats.values_list('posts_count', flat=True)), 60)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+
+    def test_comments_need_posts(self):
+        with self.assertRaises(CommandError):
+            call_command('seed_data', '--posts=0', '--comments=5',
+                         stdout=io.StringIO())
+
+
+@override_settings(DEBUG=True)
+class LoadTestTests(TestCase):
+    def test_loadtest_report(self):
+        call_command('seed_data', '--users=10', '--groups=2', '--posts=30',
+                     '--comments=10', '--follows=10', stdout=io.StringIO())
+        with tempfile.NamedTemporaryFile('r', suffix='.json') as output:
+            call_command('loadtest', '--requests=60', '--concurrency=1',
+                         '--logged-in=0.5', f'--output={output.name}',
+                         stdout=io.StringIO())
+            result = json.load(output)
+        self.assertEqual(result['total']['requests'], 60)
+        self.assertEqual(result['total']['errors'], 0)
+        index = result['views']['posts:index']
+        self.assertLessEqual(index['p50_ms'], index['p95_ms'])
+        self.assertLessEqual(index['p95_ms'], index['p99_ms'])
+        self.assertIn('posts:follow_index', result['views'])
+        self.assertFalse(any(
+            user.has_usable_password()
+            for user in User.objects.filter(username__startswith='load-')
+        ))
+
+    @override_settings(DEBUG=False)
+    def test_refuses_without_debug(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest', stdout=io.StringIO())
+
+    def test_http_login_needs_password(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest', '--url=http://localhost:8000',
+                         stdout=io.StringIO())
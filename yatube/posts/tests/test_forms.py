@@ -1,15 +1,24 @@
+import io
+import os
 import shutil
+import stat
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
+from django.db.models import F
+from PIL import Image
 
+from core.storage import DEFAULT_FILE_MODE
 from posts.models import Group, Post, Comment
 from posts.forms import PostForm
+from posts.views import write
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -86,9 +95,8 @@ class PostFormTest(TestCase):
         self.assertEqual(Post.objects.get(pk=2).text, 'New test text')
         self.assertEqual(Post.objects.get(pk=2).group.id, self.group.id)
         self.assertEqual(Post.objects.get(pk=2).author.username, "test_user")
-        self.assertTrue(
-            Post.objects.filter(image='posts/test.gif').exists()
-        )
+        image = Post.objects.get(pk=2).image.name
+        self.assertRegex(image, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
 
     def test_edit_post(self):
         """Валидная форма изменяет запись в Post"""
@@ -111,6 +119,28 @@ class PostFormTest(TestCase):
         self.assertEqual(Post.objects.get(id=post_id).group.id,
                          post_data['group'])
 
+    def test_edit_keeps_concurrent_changes(self):
+        """Правка поста не затирает комментарий и миниатюру,
+        появившиеся, пока форма была открыта"""
+        post = Post.objects.create(text='Текст', author=PostFormTest.user)
+
+        def write_meanwhile(func, *args, **kwargs):
+            Post.objects.filter(pk=post.pk).update(
+                comments_count=F('comments_count') + 1,
+                thumbnail_width=100,
+            )
+            return write(func, *args, **kwargs)
+
+        with mock.patch('posts.views.write', write_meanwhile):
+            self.authorized_client.post(
+                reverse('posts:post_edit', args=(post.pk,)),
+                data={'text': 'Новый текст'},
+            )
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.thumbnail_width, 100)
+
     def test_guest_cant_create_post(self):
         posts_count = Post.objects.count()
         form_data = {
@@ -132,6 +162,111 @@ class PostFormTest(TestCase):
         )
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIZE=(100, 100))
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def upload(self, name, fmt, size, **save):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, fmt, **save)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def test_image_resized_without_metadata(self):
+        """Картинка уменьшается и сохраняется без EXIF."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        image = self.upload('photo.jpg', 'JPEG', (400, 200), exif=exif)
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'С картинкой', 'image': image})
+        post = Post.objects.get(text='С картинкой')
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (100, 50))
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertNotIn('exif', stored.info)
+
+    def test_other_formats_stored_as_jpeg(self):
+        image = self.upload('scan.bmp', 'BMP', (20, 20))
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Из BMP', 'image': image})
+        post = Post.objects.get(text='Из BMP')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+
+    def test_duplicates_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом, сироты удаляются."""
+        for text in ('Первый', 'Второй'):
+            self.client.post(reverse('posts:post_create'), {
+                'text': text,
+                'image': self.upload(f'{text}.png', 'PNG', (10, 10)),
+            })
+        first, second = Post.objects.filter(text__in=['Первый', 'Второй'])
+        self.assertEqual(first.image.name, second.image.name)
+        path = first.image.path
+        first.delete()
+        call_command('gc_media', grace=0, stdout=io.StringIO())
+        self.assertTrue(os.path.exists(path))
+        second.delete()
+        call_command('gc_media', grace=0, stdout=io.StringIO())
+        self.assertFalse(os.path.exists(path))
+
+    @override_settings(FILE_UPLOAD_PERMISSIONS=None)
+    def test_stored_file_readable(self):
+        """Файл картинки получает права по umask, а не 0600 от mkstemp."""
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Права', 'image': self.upload('p.png', 'PNG', (10, 10)),
+        })
+        path = Post.objects.get(text='Права').image.path
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode),
+                         DEFAULT_FILE_MODE)
+
+    def test_duplicate_upload_refreshes_file(self):
+        """Повторная загрузка защищает старый файл от gc_media --grace."""
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Первый', 'image': self.upload('a.png', 'PNG', (10, 10)),
+        })
+        path = Post.objects.get(text='Первый').image.path
+        os.utime(path, (0, 0))
+        Post.objects.filter(text='Первый').delete()
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Второй', 'image': self.upload('b.png', 'PNG', (10, 10)),
+        })
+        self.assertGreater(os.path.getmtime(path), 0)
+
+    @override_settings(MAX_UPLOAD_SIZE=1024)
+    def test_oversized_upload_rejected(self):
+        """Файл больше лимита не сохраняется, форма сообщает о размере."""
+        image = self.upload('big.bmp', 'BMP', (100, 100))
+        response = self.client.post(reverse('posts:post_create'),
+                                    {'text': 'Большая', 'image': image})
+        self.assertFalse(Post.objects.filter(text='Большая').exists())
+        self.assertFormError(response, 'form', 'image',
+                             'Файл слишком большой: не больше 1,0\xa0КБ')
+
+    @override_settings(MAX_UPLOAD_SIZE=1024, DATA_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_oversized_request_not_read(self):
+        """Запрос длиннее лимита отклоняется без чтения тела."""
+        post = Post.objects.create(author=self.user, text='Старый')
+        image = self.upload('big.bmp', 'BMP', (100, 100))
+        response = self.client.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            {'text': 'Новый', 'image': image},
+        )
+        self.assertEqual(response.wsgi_request.POST.dict(), {})
+        self.assertFormError(response, 'form', 'image',
+                             'Файл слишком большой: не больше 1,0\xa0КБ')
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Старый')
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class CommentFormTests(TestCase):
     @classmethod
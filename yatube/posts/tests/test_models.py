@@ -1,5 +1,6 @@
 from django.test import TestCase
-from posts.models import Post, Group
+from posts.counters import repair, stats_for
+from posts.models import AuthorStats, Comment, Follow, Post, Group
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 
@@ -43,3 +44,56 @@ class TestPostModel(TestCase):
         expected_object_name = task.text[:15]
         self.assertEqual(expected_object_name, str(task),
                          'Не проходит по ограничению поста в 15 символов')
+
+
+class TestCounters(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='counters',
+            description='Описание',
+        )
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(
+            author=self.author, text='Текст', group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.group.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(stats_for(self.author).posts_count, 1)
+        self.assertEqual(stats_for(self.author).followers_count, 1)
+        self.assertEqual(stats_for(self.reader).following_count, 1)
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(AuthorStats.objects.get(user=self.author).posts_count,
+                         0)
+
+    def test_repair_fixes_drift(self):
+        """Пересчёт исправляет разошедшиеся счётчики."""
+        Post.objects.create(author=self.author, text='Текст', group=self.group)
+        Group.objects.update(posts_count=10)
+        report = repair()
+        self.assertEqual(report['group.posts_count'], 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertFalse(any(repair(fix=False).values()))
+
+    def test_drifted_counter_does_not_break_delete(self):
+        """Удаление проходит, даже если счётчик уже разошёлся до нуля."""
+        post = Post.objects.create(
+            author=self.author, text='Текст', group=self.group
+        )
+        Group.objects.update(posts_count=0)
+        AuthorStats.objects.filter(user=self.author).update(posts_count=0)
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import QueryBudgetMixin
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Бюджет запросов страницы с полной лентой из PAGE_POST постов: не должен
+# зависеть от числа постов и комментариев на странице
+BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 4,
+    'posts:profile': 6,
+    'posts:follow_index': 5,
+    'posts:post_detail': 6,
+}
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Группа', slug='budget', description='Описание'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        authors = [
+            User.objects.create_user(username=f'author{i}')
+            for i in range(12)
+        ]
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(author=author, group=cls.group,
+                                text=f'Пост {author.username}')
+        cls.author = authors[0]
+        cls.post = Post.objects.filter(author=cls.author).first()
+        for author in authors:
+            Comment.objects.create(post=cls.post, author=author,
+                                   text='Комментарий')
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def test_views_within_budget(self):
+        urls = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse('posts:group_list',
+                                        args=(self.group.slug,)),
+            'posts:profile': reverse('posts:profile',
+                                     args=(self.author.username,)),
+            'posts:follow_index': reverse('posts:follow_index'),
+            'posts:post_detail': reverse('posts:post_detail',
+                                         args=(self.post.pk,)),
+        }
+        for name, url in urls.items():
+            with self.subTest(view=name):
+                response = self.client.get(url)
+                self.assertQueryBudget(response, BUDGETS[name])
+
+    def test_cached_page_skips_database(self):
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('posts:index'))
+        self.assertQueryBudget(response, 2)
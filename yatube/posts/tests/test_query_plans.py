@@ -0,0 +1,87 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Полный проход по таблице без индекса и сортировка во временном B-дереве
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?posts_\w+$')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE FOR ORDER BY')
+
+
+class QueryPlanTests(TestCase):
+    """Запросы лент должны идти по индексам, без полных проходов и сортировок.
+
+    Для каждого запроса к таблицам posts_* страницы снимается
+    EXPLAIN QUERY PLAN.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='plans', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        posts = [
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'Пост {i}')
+            for i in range(15)
+        ]
+        cls.post = posts[0]
+        for i in range(3):
+            Comment.objects.create(post=cls.post, author=cls.reader,
+                                   text=f'Комментарий {i}')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def plans(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'posts_' not in sql:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                yield sql, [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, url):
+        plans = list(self.plans(url))
+        self.assertTrue(plans, f'{url}: нет запросов к таблицам posts_*')
+        for sql, plan in plans:
+            for step in plan:
+                with self.subTest(url=url, step=step):
+                    self.assertFalse(FULL_SCAN.match(step), sql)
+                    self.assertFalse(TEMP_SORT.search(step), sql)
+
+    def feed_urls(self):
+        return [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        ]
+
+    def test_feeds_use_indexes(self):
+        for url in self.feed_urls():
+            self.assert_indexed(url)
+
+    def test_cursor_pages_use_indexes(self):
+        for url in self.feed_urls()[:4]:
+            response = self.client.get(url)
+            cursor = response.context['page_obj'].next_cursor
+            self.assert_indexed(f'{url}?cursor={cursor}')
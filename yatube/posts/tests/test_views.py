@@ -1,13 +1,20 @@
+import base64
+import json
 import shutil
 import tempfile
+import time
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
-from posts.models import Group, Post, Follow
+from posts.cache import LOCK_PREFIX, get_or_compute
+from posts.models import Comment, Group, Post, Follow
+from posts.search import filter_posts
+from posts.thumbnails import generate, preload, ready
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -16,9 +23,8 @@ User = get_user_model()
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class TaskPagesTests(TestCase):
-    @classmethod
     def setUp(self):
-        super().setUpClass()
+        super().setUp()
         small_gif = (
             b'\x47\x49\x46\x38\x39\x61\x02\x00'
             b'\x01\x00\x80\x00\x00\x00\x00\x00'
@@ -204,6 +210,37 @@ class PaginatorTests(TestCase):
             reverse('posts:index') + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_pages(self):
+        """Переход по курсорам отдаёт те же записи, что и номера страниц."""
+        first = self.authorized_client.get(reverse('posts:index'))
+        cursor = first.context['page_obj'].next_cursor
+        response = self.authorized_client.get(
+            reverse('posts:index') + f'?cursor={cursor}')
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 3)
+        self.assertFalse(page_obj.has_next())
+        response = self.authorized_client.get(
+            reverse('posts:index') + f'?cursor={page_obj.previous_cursor}')
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(first.context['page_obj'])
+        )
+
+    def test_broken_cursor_shows_first_page(self):
+        response = self.authorized_client.get(
+            reverse('posts:index') + '?cursor=broken')
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_crafted_cursor_shows_first_page(self):
+        """Декодируемый курсор с негодной датой или типом не роняет view."""
+        for key in (['2020-13-45T00:00:00', 1, False], [5, 1, False],
+                    ['2020-01-01T00:00:00', 'x', False]):
+            token = base64.urlsafe_b64encode(json.dumps(key).encode())
+            with self.subTest(key=key):
+                response = self.authorized_client.get(
+                    reverse('posts:index') + f'?cursor={token.decode()}')
+                self.assertEqual(len(response.context['page_obj']), 10)
+
 
 class CacheTest(TestCase):
     @classmethod
@@ -222,19 +259,79 @@ class CacheTest(TestCase):
         cache.clear()
 
     def test_cache_index_page(self):
-        """Запись остаётся на странице до принудительной очистки кэша"""
-        response = self.authorized_author.get(reverse('posts:index'))
-        content = response.content
+        """Главная отдаётся из кэша, пока в базе ничего не менялось"""
         Post.objects.create(
             text='Тестовый пост',
             author=self.author,
         )
         response = self.authorized_author.get(reverse('posts:index'))
+        content = response.content
+        # update() обходит сигналы, поэтому кэш не сбрасывается
+        Post.objects.update(text='Изменённый текст')
+        response = self.authorized_author.get(reverse('posts:index'))
         self.assertEqual(content, response.content)
         cache.clear()
         response = self.authorized_author.get(reverse('posts:index'))
         self.assertNotEqual(content, response.content)
 
+    def test_new_post_resets_cache(self):
+        """Новая запись видна на главной сразу, без очистки кэша"""
+        response = self.authorized_author.get(reverse('posts:index'))
+        content = response.content
+        Post.objects.create(
+            text='Тестовый пост',
+            author=self.author,
+        )
+        response = self.authorized_author.get(reverse('posts:index'))
+        self.assertNotEqual(content, response.content)
+        self.assertContains(response, 'Тестовый пост')
+
+    def test_name_change_resets_pages(self):
+        """Новое имя автора сразу видно в ленте, профиле и на странице поста"""
+        author = User.objects.create_user(username='renamed')
+        post = Post.objects.create(text='Тестовый пост', author=author)
+        urls = (reverse('posts:index'),
+                reverse('posts:profile', args=(author.username,)),
+                reverse('posts:post_detail', args=(post.pk,)))
+        for url in urls:
+            self.client.get(url)
+        author.first_name = 'Новое'
+        author.last_name = 'Имя'
+        author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Новое Имя')
+
+    def test_stale_page_served_while_rebuilding(self):
+        """Пока страницу пересчитывает другой процесс, отдаётся старая копия"""
+        stale = HttpResponse('старая копия')
+        cache.set('page', (stale, time.time() - 1, 0.1))
+        cache.add(LOCK_PREFIX + 'page', 1)
+        response = get_or_compute('page', self.fail, 60)
+        self.assertEqual(response.content, stale.content)
+
+    def test_last_copy_served_after_version_bump(self):
+        """После смены поколения, пока страница строится, отдаётся прежняя"""
+        get_or_compute('page:1', lambda: HttpResponse('прежняя'), 60, 'last')
+        cache.add(LOCK_PREFIX + 'page:2', 1)
+        response = get_or_compute('page:2', self.fail, 60, 'last')
+        self.assertEqual(response.content, 'прежняя'.encode())
+
+    def test_edit_refreshes_post_card(self):
+        """После правки поста карточка в ленте показывает новый текст"""
+        post = Post.objects.create(
+            text='Старый текст',
+            author=self.author,
+        )
+        self.authorized_author.get(reverse('posts:index'))
+        self.authorized_author.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            data={'text': 'Новый текст'},
+        )
+        response = self.authorized_author.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый текст')
+        self.assertNotContains(response, 'Старый текст')
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -297,6 +394,33 @@ class FollowViewsTest(TestCase):
         post = response.context['posts'][0]
         self.assertEqual(post.text, self.post.text)
 
+    def test_unfollow_removes_posts_from_index(self):
+        """После отписки записи автора пропадают из ленты."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.filter(user=self.follower, author=self.author).delete()
+        response = self.authorized_follower.get(reverse('posts:follow_index'))
+        self.assertNotIn(self.post, response.context['posts'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_read_on_request(self):
+        """Записи популярных авторов подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(post.timeline_entries.exists())
+        response = self.authorized_follower.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['posts'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_former_celebrity_posts_stay_in_index(self):
+        """Записи, не разосланные знаменитостью, остаются в ленте."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(post.timeline_entries.exists())
+        Follow.objects.filter(user=self.user, author=self.author).delete()
+        response = self.authorized_follower.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['posts'])
+
     def test_post_not_in_user_index(self):
         """Новой записи автора нет в ленте неподписанных пользователей."""
         response = self.authorized_user.get(reverse('posts:follow_index'))
@@ -345,3 +469,152 @@ class CommentFormTests(TestCase):
         self.assertFalse(
             Post.objects.filter(text=form_data['text'],).exists()
         )
+
+
+@override_settings(PAGE_COMMENTS=20)
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='test_author')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.author)
+        for i in range(25):
+            Comment.objects.create(post=cls.post, author=cls.author,
+                                   text=f'Комментарий {i}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_shows_first_comments(self):
+        """На странице поста только первая страница комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertTrue(comments.has_next())
+
+    def test_more_comments_fragment(self):
+        """Фрагмент отдаёт следующие комментарии по курсору."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        cursor = response.context['comments'].next_cursor
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk,))
+            + f'?cursor={cursor}')
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [f'Комментарий {i}' for i in range(20, 25)]
+        )
+        self.assertFalse(comments.has_next())
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='test_author')
+        cls.match = Post.objects.create(
+            text='Ёжик в тумане, ёжик и лошадка', author=cls.author)
+        cls.weak = Post.objects.create(
+            text='Длинная история, где ежик появляется всего один раз '
+                 'среди множества других слов про лес и реку',
+            author=cls.author)
+        cls.other = Post.objects.create(text='Про котов', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_ranked_results(self):
+        """Находятся посты со словом, более релевантные — выше."""
+        self.assertEqual(self.search('ежик'), [self.match, self.weak])
+
+    def test_prefix_and_operators(self):
+        """Последнее слово ищется по префиксу, операторы FTS5 экранируются."""
+        self.assertEqual(self.search('кот'), [self.other])
+        self.assertEqual(self.search('(кот"'), [self.other])
+
+    def test_index_follows_changes(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        post = Post.objects.get(pk=self.other.pk)
+        post.text = 'Про собак'
+        post.save()
+        self.assertEqual(self.search('собак'), [post])
+        post.delete()
+        self.assertEqual(self.search('собак'), [])
+
+    def test_filter_posts_uses_subquery(self):
+        """Фильтр поиска (админка) выбирает посты подзапросом к индексу."""
+        found = filter_posts(Post.objects.all(), 'ежик')
+        self.assertIn('MATCH', str(found.query))
+        self.assertEqual(set(found), {self.match, self.weak})
+        self.assertFalse(filter_posts(Post.objects.all(), '!!').exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='test_author')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.author,
+            image=SimpleUploadedFile(
+                name='thumb.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00'
+                    b'\x80\x00\x00\x00\x00\x00\xFF\xFF\xFF\x21'
+                    b'\xF9\x04\x00\x00\x00\x00\x00\x2C\x00\x00'
+                    b'\x00\x00\x01\x00\x01\x00\x00\x02\x02\x44'
+                    b'\x01\x00\x3B'
+                ),
+                content_type='image/gif'
+            )
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_original_until_thumbnail_ready(self):
+        """До готовности миниатюры показывается оригинал, затем миниатюра."""
+        url = reverse('posts:index')
+        self.assertIsNone(ready(self.post.image))
+        response = self.client.get(url)
+        self.assertContains(response, self.post.image.url)
+        updated = self.post.updated
+        self.assertTrue(generate(self.post.pk))
+        thumbnail = ready(self.post.image)
+        self.assertIsNotNone(thumbnail)
+        self.assertGreater(Post.objects.get(pk=self.post.pk).updated, updated)
+        response = self.client.get(url)
+        self.assertContains(response, thumbnail.url)
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, ' 320w, ')
+        self.assertNotContains(response, self.post.image.url)
+
+    def test_preload_page(self):
+        """Миниатюры страницы находятся по размерам на посте или одним
+        обращением к хранилищу sorl, если размеров ещё нет."""
+        generate(self.post.pk)
+        Post.objects.filter(pk=self.post.pk).update(thumbnail_width=None)
+        posts = list(Post.objects.all()) + [Post(text='Без картинки')]
+        cache.clear()
+        with self.assertNumQueries(1):
+            preload(posts)
+        self.assertEqual(posts[0].thumbnail.url, ready(posts[0].image).url)
+        self.assertIsNone(posts[1].thumbnail)
+        generate(self.post.pk)
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(0):
+            preload(posts)
+        thumbnail = posts[0].thumbnail
+        self.assertEqual((thumbnail.width, thumbnail.height), (960, 339))
@@ -0,0 +1,216 @@
+"""Миниатюры изображений постов готовятся в фоне, а не во время запроса.
+
+После сохранения поста с новой картинкой миниатюра ставится в очередь
+пула потоков (после коммита транзакции). Шаблоны берут только готовую
+миниатюру из хранилища sorl и до её появления показывают оригинал.
+Когда миниатюра готова, у поста сохраняются её размеры, обновляется
+``updated`` и сбрасываются страницы, где он виден: карточка перерисуется
+уже с миниатюрой.
+
+Кроме основной миниатюры строятся её копии шириной
+POST_THUMBNAIL_WIDTHS, а если Pillow умеет WebP — ещё и копии в WebP;
+шаблон отдаёт их через srcset.
+
+Размеры на посте заодно означают, что все миниатюры есть: их адреса и
+тег <img> получаются без обращения к файлам и хранилищу sorl. Посты без
+размеров (загруженные до их появления) проверяются по хранилищу sorl
+одним get_many на страницу и получают только основную миниатюру.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    KVStore as CachedDBKVStore,
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.timing import timed
+
+from .cache import bump_post
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Без поддержки WebP в Pillow обходимся исходным форматом
+WEBP = features.check('webp')
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def thumbnail_file(image, geometry, options):
+    """Файл миниатюры под тем же именем, что выберет ``get_thumbnail``.
+
+    Повторяет подстановку опций по умолчанию из бэкенда sorl, но ничего
+    не читает и не создаёт.
+    """
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def variants(fmt=None):
+    """Геометрии и опции копий основной миниатюры для srcset по ширинам."""
+    geometry, options = settings.POST_THUMBNAIL
+    width, height = map(int, geometry.split('x'))
+    options = dict(options, format=fmt) if fmt else options
+    for size in settings.POST_THUMBNAIL_WIDTHS:
+        yield size, f'{size}x{round(height * size / width)}', options
+
+
+def srcset(image, fmt=None):
+    return ', '.join(
+        f'{thumbnail_file(image, geometry, options).url} {size}w'
+        for size, geometry, options in variants(fmt)
+    )
+
+
+def ready(image):
+    """Готовая миниатюра картинки или None, если её ещё нет."""
+    if not image:
+        return None
+    geometry, options = settings.POST_THUMBNAIL
+    return default.kvstore.get(thumbnail_file(image, geometry, options))
+
+
+def _lookup(files):
+    """Записи хранилища sorl для файлов миниатюр: {ключ: ImageFile}.
+
+    Для хранилища cached_db это один get_many к кэшу и один запрос к
+    таблице для промахов; отсутствующие записи кэшируются как пустые,
+    так же как это делает сам sorl.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        return {
+            key: kvstore.get(file) for key, file in files.items()
+        }
+    raw_keys = {add_prefix(key): key for key in files}
+    found = kvstore.cache.get_many(list(raw_keys))
+    missing = [raw for raw in raw_keys if raw not in found]
+    if missing:
+        rows = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        kvstore.cache.set_many(
+            {raw: rows.get(raw, EMPTY_VALUE) for raw in missing},
+            sorl_settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+        found.update(rows)
+    return {
+        raw_keys[raw]: deserialize_image_file(value)
+        for raw, value in found.items() if value != EMPTY_VALUE
+    }
+
+
+@timed('thumbnail')
+def preload(posts):
+    """Проставляет постам страницы ``thumbnail``: миниатюру или None."""
+    geometry, options = settings.POST_THUMBNAIL
+    pending = {}
+    for post in posts:
+        post.thumbnail = None
+        if not post.image:
+            continue
+        file = thumbnail_file(post.image, geometry, options)
+        if post.thumbnail_width:
+            file.set_size((post.thumbnail_width, post.thumbnail_height))
+            file.srcset = srcset(post.image)
+            file.webp_srcset = srcset(post.image, 'WEBP') if WEBP else ''
+            file.sizes = settings.POST_THUMBNAIL_SIZES
+            post.thumbnail = file
+        else:
+            pending[file.key] = (post, file)
+    if pending:
+        found = _lookup({key: file for key, (_, file) in pending.items()})
+        for key, thumbnail in found.items():
+            thumbnail.srcset = thumbnail.webp_srcset = ''
+            pending[key][0].thumbnail = thumbnail
+    return posts
+
+
+def generate(post_id):
+    """Создаёт все миниатюры картинки поста.
+
+    Возвращает False, если у поста нет картинки или её файла.
+    """
+    post = Post.objects.select_related('author').filter(pk=post_id).first()
+    if post is None or not post.image:
+        return False
+    geometry, options = settings.POST_THUMBNAIL
+    thumbnail = get_thumbnail(post.image, geometry, **options)
+    if thumbnail.size is None:
+        # sorl не нашёл исходный файл и ничего не построил
+        return False
+    for fmt in (None, 'WEBP') if WEBP else (None,):
+        for _, variant, variant_options in variants(fmt):
+            get_thumbnail(post.image, variant, **variant_options)
+    Post.objects.filter(pk=post.pk).update(
+        thumbnail_width=thumbnail.width,
+        thumbnail_height=thumbnail.height,
+        updated=timezone.now(),
+    )
+    bump_post(post, post.group_id)
+    return True
+
+
+def safe_generate(post_id):
+    """Как generate, но ошибки только пишутся в лог: сохранение поста из-за
+    миниатюры не должно падать."""
+    try:
+        return generate(post_id)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру поста %s', post_id)
+        return False
+
+
+def run(post_id):
+    """Задача пула; у каждого потока своё соединение с базой."""
+    try:
+        safe_generate(post_id)
+    finally:
+        connection.close()
+
+
+def pool():
+    """Пул потоков текущего процесса; после fork создаётся заново."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def schedule(post_id):
+    """Ставит пост в очередь; без воркеров миниатюра строится сразу."""
+    if settings.THUMBNAIL_WORKERS:
+        return pool().submit(run, post_id)
+    safe_generate(post_id)
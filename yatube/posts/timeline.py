@@ -0,0 +1,173 @@
+"""Лента подписок: fan-out при записи с fan-out при чтении для
+авторов с большим числом подписчиков."""
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from .counters import stats_by_id
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+
+def is_celebrity(author_id):
+    """Посты таких авторов не рассылаются, а читаются при запросе ленты."""
+    followers = stats_by_id(author_id).followers_count
+    return followers > settings.TIMELINE_FANOUT_LIMIT
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post,
+                          author_id=post.author_id, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Переносит последние посты автора в ленту нового подписчика."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )[:settings.TIMELINE_BACKFILL]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=pk,
+                          author_id=author_id, pub_date=pub_date)
+            for pk, pub_date in posts
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+# Последние TIMELINE_BACKFILL постов каждого автора не из знаменитостей
+# для каждого его подписчика, одним INSERT ... SELECT
+REFILL_SQL = """
+INSERT OR IGNORE INTO posts_timelineentry
+    (user_id, post_id, author_id, pub_date)
+SELECT follow.user_id, recent.id, recent.author_id, recent.pub_date
+FROM posts_follow follow
+JOIN posts_authorstats stats ON stats.user_id = follow.author_id
+JOIN (
+    SELECT id, author_id, pub_date, ROW_NUMBER() OVER (
+        PARTITION BY author_id ORDER BY pub_date DESC, id DESC
+    ) AS position
+    FROM posts_post
+) recent ON recent.author_id = follow.author_id
+WHERE stats.followers_count <= %s AND recent.position <= %s
+"""
+
+
+def refill(batch_size=1000):
+    """Досоздаёт недостающие записи лент по всем подпискам.
+
+    Нужна после массовой загрузки через bulk_create, которая обходит
+    сигналы; счётчики подписчиков должны быть уже пересчитаны. В SQLite
+    всё делает один запрос внутри базы. Иначе подписки читаются потоком,
+    сгруппированными по автору, так что посты каждого автора
+    запрашиваются один раз.
+    """
+    if connection.vendor == 'sqlite':
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(REFILL_SQL, [settings.TIMELINE_FANOUT_LIMIT,
+                                        settings.TIMELINE_BACKFILL])
+        return
+    follows = Follow.objects.filter(
+        author__stats__followers_count__lte=settings.TIMELINE_FANOUT_LIMIT
+    ).order_by('author_id').values_list('author_id', 'user_id')
+    entries = []
+    for author_id, rows in groupby(
+        follows.iterator(chunk_size=batch_size), key=itemgetter(0)
+    ):
+        posts = list(
+            Post.objects.filter(author_id=author_id).values_list(
+                'pk', 'pub_date'
+            )[:settings.TIMELINE_BACKFILL]
+        )
+        for _, user_id in rows:
+            entries.extend(
+                TimelineEntry(user_id=user_id, post_id=pk,
+                              author_id=author_id, pub_date=pub_date)
+                for pk, pub_date in posts
+            )
+            if len(entries) >= batch_size:
+                TimelineEntry.objects.bulk_create(
+                    entries, batch_size=500, ignore_conflicts=True
+                )
+                entries = []
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=500, ignore_conflicts=True
+    )
+
+
+def author_returned(author_id):
+    """Досылает подписчикам посты автора, который перестал быть знаменитостью.
+
+    Пока подписчиков было больше TIMELINE_FANOUT_LIMIT, его посты не
+    рассылались, а подмешивались при чтении; теперь ленты читаются только
+    из записей, так что последние посты автора дописываются в них.
+    """
+    posts = list(
+        Post.objects.filter(author_id=author_id).values_list(
+            'pk', 'pub_date'
+        )[:settings.TIMELINE_BACKFILL]
+    )
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    entries = []
+    for user_id in followers.iterator():
+        entries.extend(
+            TimelineEntry(user_id=user_id, post_id=pk,
+                          author_id=author_id, pub_date=pub_date)
+            for pk, pub_date in posts
+        )
+        if len(entries) >= 1000:
+            TimelineEntry.objects.bulk_create(
+                entries, batch_size=500, ignore_conflicts=True
+            )
+            entries = []
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=500, ignore_conflicts=True
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def celebrities_followed_by(user):
+    """Авторы из подписок пользователя, чьи посты не рассылаются."""
+    return list(
+        AuthorStats.objects.filter(
+            user__following__user=user,
+            followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+        ).values_list('user_id', flat=True)
+    )
+
+
+def timeline_posts(user):
+    """Посты ленты подписок пользователя, от новых к старым."""
+    celebrities = celebrities_followed_by(user)
+    if not celebrities:
+        return Post.objects.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date')
+        ).order_by('-feed_date')
+    entries = TimelineEntry.objects.filter(user=user).values('post')
+    return Post.objects.filter(
+        Q(pk__in=entries) | Q(author__in=celebrities)
+    )
@@ -2,25 +2,49 @@ from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
 from django.core.paginator import Paginator
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
-from django.views.decorators.cache import cache_page
 
+from core.uploads import rejected
+from core.writer import write
+
+from .cache import cache_versioned
+from . import exporting
+from .counters import stats_for
 from .forms import PostForm, CommentForm
-from .models import Group, Post, Follow
+from .models import Comment, Group, Post, Follow
+from .pagination import CursorPaginator, paginate
+from .search import SearchResults
+from .timeline import timeline_posts
 
 User = get_user_model()
 
 
-def paginator(request, posts):
-    paginator = Paginator(posts, settings.PAGE_POST)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+def paginator(request, posts, count=None):
+    return paginate(request, posts, settings.PAGE_POST, count=count)
+
+
+def comments_page(post_id, cursor=None):
+    """Страница комментариев по ключу (created, id), от старых к новым."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).order_by('created')
+    return CursorPaginator(
+        comments, settings.PAGE_COMMENTS, key='created'
+    ).get_cursor_page(cursor)
+
 
+def author_scope(post_id):
+    """Страница поста зависит и от профиля автора: там число его постов."""
+    username = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True
+    ).first()
+    return f'profile:{username}'
 
-@cache_page(20)
+
+@cache_versioned('index', 'groups')
 def index(request):
-    posts = Post.objects.all()
+    posts = Post.objects.select_related('author', 'group')
     page_obj = paginator(request, posts)
     context = {
         'posts': posts,
@@ -29,10 +53,27 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@cache_versioned('index', 'groups')
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts = SearchResults(
+        query, Post.objects.select_related('author', 'group')
+    )
+    page_obj = Paginator(posts, settings.PAGE_POST).get_page(
+        request.GET.get('page')
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@cache_versioned('group:{slug}', 'groups')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = paginator(request, posts)
+    posts = group.posts.select_related('author')
+    page_obj = paginator(request, posts, count=group.posts_count)
     context = {
         'group': group,
         'posts': posts,
@@ -41,11 +82,12 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_versioned('profile:{username}', 'groups')
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    posts_count = posts.count()
-    page_obj = paginator(request, posts)
+    posts = author.posts.select_related('group')
+    posts_count = stats_for(author).posts_count
+    page_obj = paginator(request, posts, count=posts_count)
     following = request.user.is_authenticated and author.following.exists()
     context = {
         'posts': posts,
@@ -57,22 +99,58 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@cache_versioned('post:{post_id}', 'groups', author_scope)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
     form = CommentForm(request.POST or None)
-    author = post.author
-    posts = author.posts.all()
-    post_count = posts.count()
-    post_comments = post.comments.all()
+    posts_count = stats_for(post.author).posts_count
     context = {
         'form': form,
-        'comments': post_comments,
+        'comments': comments_page(post.pk),
         'post': post,
-        'post_count': post_count,
+        'posts_count': posts_count,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@cache_versioned('post:{post_id}')
+def post_comments(request, post_id):
+    """Фрагмент со следующей страницей комментариев для «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(post.pk, request.GET.get('cursor')),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+def export_response(fmt, filename, **filters):
+    if fmt not in exporting.FORMATS:
+        raise Http404('Неизвестный формат выгрузки')
+    response = StreamingHttpResponse(
+        exporting.serialize(exporting.post_rows(**filters), fmt),
+        content_type=exporting.FORMATS[fmt],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{filename}.{fmt}"'
+    )
+    return response
+
+
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    return export_response(request.GET.get('format', 'jsonl'),
+                           author.username, author=author)
+
+
+def group_export(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return export_response(request.GET.get('format', 'jsonl'),
+                           group.slug, group=group)
+
+
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
@@ -81,7 +159,7 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        write(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
@@ -91,11 +169,12 @@ def post_create(request):
         form = PostForm()
         return render(request, 'posts/create_post.html',
                       {'form': form})
-    form = PostForm(request.POST, files=request.FILES or None)
+    form = PostForm(request.POST, files=request.FILES or None,
+                    oversized=rejected(request))
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        write(post.save)
         return redirect('posts:profile', username=post.author)
     return render(request, 'posts/create_post.html',
                   {'form': form})
@@ -107,14 +186,20 @@ def post_edit(request, post_id):
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post_id)
     form = PostForm(
-        request.POST or None,
+        request.POST if request.method == 'POST' else None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        oversized=rejected(request),
     )
     is_edit = True
     if form.is_valid():
         post = form.save(commit=False)
-        post.save()
+        # Пока форма была открыта, счётчик комментариев и миниатюра могли
+        # измениться: пишем только поля формы
+        fields = [*form.fields, 'updated']
+        if 'image' in form.changed_data:
+            fields += ['thumbnail_width', 'thumbnail_height']
+        write(post.save, update_fields=fields)
         return redirect('posts:post_detail', post.pk)
     context = {
         'post': post,
@@ -126,7 +211,7 @@ def post_edit(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    posts = timeline_posts(request.user).select_related('author', 'group')
     page_obj = paginator(request, posts)
     context = {
         'posts': posts,
@@ -145,12 +230,12 @@ def profile_follow(request, username):
         author=author.id
     ).exists()
     if follow_check == 0 and author.id != user.id:
-        Follow.objects.create(user=request.user, author=author)
+        write(Follow.objects.create, user=request.user, author=author)
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    write(Follow.objects.filter(user=request.user, author=author).delete)
     return redirect('posts:profile', username=username)
@@ -11,6 +11,9 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
+
+from core import sqlite
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -25,6 +28,9 @@ SECRET_KEY = 'x_r=koy8jyui$35xn=t8gsw3am1!=l3m3n#m(q)-=p+9^x#_)y'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Запуск тестов: manage.py test или pytest
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 ALLOWED_HOSTS = [
     'localhost',
     '127.0.0.1',
@@ -51,22 +57,57 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.TimingMiddleware',
+    'core.middleware.QueryCountMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaMiddleware',
 ]
 
 PAGE_POST = 10
+PAGE_COMMENTS = 20
+
+# Учёт SQL-запросов каждого запроса (заголовок X-Query-Count, поиск N+1)
+QUERY_INSTRUMENTATION = DEBUG
+# Сколько одинаковых по форме запросов считается признаком N+1
+QUERY_REPEAT_THRESHOLD = 5
+
+# Замер фаз запроса: заголовок Server-Timing и гистограммы по view,
+# которые персонал читает на /metrics/
+REQUEST_TIMING = True
+# Границы корзин гистограмм, секунды
+REQUEST_TIMING_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+# Сколько строк функций и форм SQL в отчёте ?__profile=1
+PROFILE_TOP = 40
+
+# Журнал SQL: статистика по формам запросов и view для команды
+# slow_queries, а запросы дольше порога (секунды) пишутся в лог.
+# В тестах выключен, чтобы не писать в рабочий файл статистики
+SLOW_QUERY_LOG = not TESTING
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_LOG_PATH = os.path.join(BASE_DIR, 'cache', 'queries.sqlite3')
+# Как часто процесс сбрасывает накопленную статистику в файл, секунды
+SLOW_QUERY_FLUSH_INTERVAL = 10
+
+# Авторы с большим числом подписчиков не рассылают посты по лентам,
+# их посты подмешиваются в ленту при чтении
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BACKFILL = 1000
 
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -94,6 +135,49 @@ DATABASES = {
     }
 }
 
+# Боевой профиль SQLite (WAL, mmap, busy_timeout, постоянные соединения),
+# см. core.sqlite; включается переменной окружения
+SQLITE_PRODUCTION = os.environ.get('YATUBE_SQLITE_PRODUCTION') == '1'
+SQLITE_PRAGMAS = sqlite.PRAGMAS
+if SQLITE_PRODUCTION:
+    DATABASES['default'] = sqlite.database(DATABASES['default']['NAME'])
+
+# Реплики для чтения лент (core.routers); включаются переменной окружения
+# YATUBE_REPLICA=1, копию основной базы обновляет команда sync_replica
+REPLICA_DATABASES = []
+if os.environ.get('YATUBE_REPLICA') == '1':
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        NAME=os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        TEST={'MIRROR': 'default'},
+    )
+    REPLICA_DATABASES = ['replica']
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# С реплик читаются только модели этих приложений: сессии и
+# пользователи всегда берутся с основной базы
+REPLICA_APPS = ('posts',)
+REPLICA_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+)
+# Сколько секунд после записи посетитель читает с основной базы;
+# должно быть больше интервала обновления реплики
+REPLICA_STICKY_COOKIE = 'primary_until'
+REPLICA_STICKY_SECONDS = 30
+REPLICA_SYNC_INTERVAL = 5
+
+# Пишущие операции view выполняет один поток процесса, собирая их в
+# общие транзакции (core.writer); включается переменной окружения
+WRITE_QUEUE = os.environ.get('YATUBE_WRITE_QUEUE') == '1'
+# Сколько операций в одной транзакции и сколько секунд ждать попутных
+WRITE_QUEUE_BATCH = 50
+WRITE_QUEUE_WINDOW = 0.002
+# Сколько секунд поток запроса ждёт свою операцию
+WRITE_QUEUE_TIMEOUT = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -147,8 +231,54 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Файлы больше лимита отбрасываются ещё при чтении запроса
+FILE_UPLOAD_HANDLERS = [
+    'core.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+# Картинка поста хранится уменьшенной до этих размеров и пересжатой
+POST_IMAGE_MAX_SIZE = (2560, 2560)
+POST_IMAGE_QUALITY = 85
+
+# Общий для всех воркеров кэш в файле SQLite: сброс поколений страниц
+# доходит до всех процессов, а данные не дублируются в каждом из них
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
     }
 }
+if TESTING:
+    # Тесты очищают кэш: рабочий файл кэша они трогать не должны
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Кэшированные страницы сбрасываются при записи через номера поколений,
+# поэтому их можно хранить долго
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Сколько просроченная страница ещё отдаётся, пока её пересчитывают
+PAGE_CACHE_STALE = 60 * 5
+# Блокировка пересчёта и ожидание чужого пересчёта, секунды
+PAGE_CACHE_LOCK_TIMEOUT = 10
+PAGE_CACHE_LOCK_WAIT = 2
+# Карточки постов в лентах: ключ меняется при правке поста
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Миниатюра изображения поста в лентах и на странице поста
+POST_THUMBNAIL = ('960x339', {'crop': 'center', 'upscale': True})
+# Ширины копий миниатюры для srcset и подсказка браузеру о ширине картинки
+POST_THUMBNAIL_WIDTHS = (320, 640, 960)
+POST_THUMBNAIL_SIZES = '(max-width: 992px) 100vw, 960px'
+# Потоки, которые готовят миниатюры после сохранения поста; при 0
+# миниатюра строится сразу после коммита, в том же процессе. В тестах
+# фоновые потоки не нужны: они переживают тест и пишут в MEDIA_ROOT уже
+# после того, как тест его удалил
+THUMBNAIL_WORKERS = 0 if TESTING else 2